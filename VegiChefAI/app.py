@@ -1,10 +1,25 @@
 import os
+import gc
 import json
+import atexit
+import functools
 import logging
-from flask import Flask, render_template, request, jsonify, session
+from flask import Flask, Response, make_response, render_template, request, jsonify, session, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import DeclarativeBase
-from openai_helper import get_cooking_instructions
+from openai_helper import (get_cooking_instructions, stream_cooking_instructions, InstructionStreamParser,
+                           fallback_instructions, instruction_cache_key, missing_ingredients_for)
+from catalog import CatalogCache, CatalogSnapshot, IngredientLexicon, encode_json, load_snapshot
+from instruction_cache import ComputationAbandoned, DatabaseInstructionStore, InstructionCache
+from http_cache import body_digest, compress_response, etag_for
+from suggestions import MAX_SUGGESTIONS
+from search_cache import SearchResultCache, canonical_search
+from batch_search import BatchRanker
+from user_activity import LastActiveTracker
+from favorites_cache import FavoriteIdsCache, new_favorites_token
+import metrics
+from scoring import (calculate_match_percentage, get_missing_ingredients,  # noqa: F401
+                     filter_recipes, get_scoring_engine)
 
 # Set up logging for debugging
 logging.basicConfig(level=logging.DEBUG)
@@ -26,94 +41,254 @@ app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
     "pool_recycle": 300,
     "pool_pre_ping": True,
 }
+# Seconds between catalog version checks made by each worker
+app.config["CATALOG_CHECK_INTERVAL"] = float(os.environ.get("CATALOG_CHECK_INTERVAL", "5"))
+# In-process AI instruction cache size and lifetime, in front of the cached_instructions table
+app.config["AI_CACHE_SIZE"] = int(os.environ.get("AI_CACHE_SIZE", "1024"))
+app.config["AI_CACHE_TTL"] = float(os.environ.get("AI_CACHE_TTL", "3600"))
+# Seconds between batched last_active writes
+app.config["LAST_ACTIVE_FLUSH_INTERVAL"] = float(os.environ.get("LAST_ACTIVE_FLUSH_INTERVAL", "60"))
+# Maximum operations accepted by one /update_favorites request
+app.config["FAVORITES_BATCH_LIMIT"] = int(os.environ.get("FAVORITES_BATCH_LIMIT", "500"))
+# Users whose favorite recipe ids are kept per worker (the session only holds a token naming them)
+app.config["FAVORITES_CACHE_SIZE"] = int(os.environ.get("FAVORITES_CACHE_SIZE", "10000"))
+# Prebuilt catalog snapshot (see build_catalog.py) loaded at startup instead of querying the database
+app.config["CATALOG_ARTIFACT"] = os.environ.get("CATALOG_ARTIFACT")
+# Responses at least this large are gzip/brotli compressed when the client accepts it
+app.config["COMPRESS_MIN_SIZE"] = int(os.environ.get("COMPRESS_MIN_SIZE", "1024"))
+app.config["COMPRESS_LEVEL"] = int(os.environ.get("COMPRESS_LEVEL", "6"))
+# Canonical searches whose ranked results are kept per worker (0 disables the cache)
+app.config["SEARCH_CACHE_SIZE"] = int(os.environ.get("SEARCH_CACHE_SIZE", "1024"))
+# Requests slower than this many milliseconds are logged with their phases and SQL counts (0 disables)
+app.config["SLOW_REQUEST_MS"] = float(os.environ.get("SLOW_REQUEST_MS", "0"))
+# Maximum queries accepted by one /search_recipes/batch request
+app.config["BATCH_SEARCH_LIMIT"] = int(os.environ.get("BATCH_SEARCH_LIMIT", "500"))
+# Forked processes ranking large batches (0 ranks every batch in the request's process)
+app.config["BATCH_SEARCH_PROCESSES"] = int(os.environ.get("BATCH_SEARCH_PROCESSES", "0"))
+# Ranking backend for search_recipes: "python" (default), "numpy" or "sql"
+app.config["SEARCH_ENGINE"] = os.environ.get("SEARCH_ENGINE", "python")
 
 # Initialize the app with the extension
 db.init_app(app)
 
-# Create tables and import models after db initialization
+# Import models after db initialization
 with app.app_context():
     import models  # noqa: F401
-    db.create_all()
+    # SQL statements are counted and timed per request for /metrics
+    metrics.instrument_engine(db.engine)
+
+def init_db():
+    """Create missing tables, columns and indexes; run once at deploy or startup, not per import"""
+    with app.app_context():
+        db.create_all()
+        models.add_missing_columns()
+        models.create_missing_indexes()
 
 # Database-based recipe loading
 def load_recipes():
     """Load recipes from the database"""
     try:
-        from models import Recipe
-        recipes = Recipe.query.all()
-        return [recipe.to_dict() for recipe in recipes]
+        from models import load_recipe_dicts
+        return load_recipe_dicts()
     except Exception as e:
         logging.error(f"Error loading recipes from database: {e}")
         return []
 
-def calculate_match_percentage(user_ingredients, recipe_ingredients):
-    """Calculate what percentage of recipe ingredients the user has"""
-    if not recipe_ingredients:
-        return 0
-    
-    user_ingredients_lower = [ing.lower().strip() for ing in user_ingredients]
-    recipe_ingredients_lower = [ing.lower().strip() for ing in recipe_ingredients]
-    
-    matches = sum(1 for recipe_ing in recipe_ingredients_lower 
-                  if any(user_ing in recipe_ing or recipe_ing in user_ing 
-                        for user_ing in user_ingredients_lower))
-    
-    return round((matches / len(recipe_ingredients_lower)) * 100)
+def build_catalog_snapshot(previous=None):
+    """Build a catalog snapshot from the database, tagged with the version it was read at"""
+    from models import Ingredient, get_catalog_version, load_recipe_dicts
+    with app.app_context():
+        # Read the version first so a concurrent write can only make the snapshot look older
+        version = get_catalog_version()
+        vocabulary = db.session.scalars(db.select(Ingredient.name)).all()
+        recipes = load_recipe_dicts()
+    # Reuse the containment table so only new ingredients need resolving
+    resolver = previous.resolver if previous is not None else None
+    return CatalogSnapshot(version, recipes, vocabulary=vocabulary, resolver=resolver)
 
-def get_missing_ingredients(user_ingredients, recipe_ingredients):
-    """Get list of missing ingredients"""
-    user_ingredients_lower = [ing.lower().strip() for ing in user_ingredients]
-    recipe_ingredients_lower = [ing.lower().strip() for ing in recipe_ingredients]
-    
-    missing = []
-    for recipe_ing in recipe_ingredients_lower:
-        if not any(user_ing in recipe_ing or recipe_ing in user_ing 
-                  for user_ing in user_ingredients_lower):
-            # Find the original case ingredient
-            original_ing = next(ing for ing in recipe_ingredients 
-                              if ing.lower().strip() == recipe_ing)
-            missing.append(original_ing)
-    
-    return missing
+def read_catalog_version():
+    """Read the current catalog version from the database"""
+    from models import get_catalog_version
+    with app.app_context():
+        return get_catalog_version()
 
-def filter_recipes(recipes, filters, meal_type):
-    """Filter recipes based on dietary preferences and meal type"""
-    filtered = []
-    
-    for recipe in recipes:
-        # Check meal type filter
-        if meal_type and meal_type != "All" and recipe.get("type", "").lower() != meal_type.lower():
-            continue
-            
-        # Check dietary filters
-        recipe_tags = [tag.lower() for tag in recipe.get("tags", [])]
-        
-        # Skip if filters don't match
-        if filters.get("no_onion_garlic") and "no onion/garlic" not in recipe_tags:
-            continue
-        if filters.get("jain") and "jain" not in recipe_tags:
-            continue
-        if filters.get("satvik") and "satvik" not in recipe_tags:
-            continue
-        if filters.get("quick") and "quick" not in recipe_tags:
-            continue
-        if filters.get("healthy") and "healthy" not in recipe_tags:
-            continue
-            
-        filtered.append(recipe)
+# Per-worker catalog snapshot, rebuilt in the background when the catalog version moves
+catalog_cache = CatalogCache(read_catalog_version, build_catalog_snapshot,
+                             check_interval=app.config["CATALOG_CHECK_INTERVAL"])
+
+scoring_engine = get_scoring_engine(app.config["SEARCH_ENGINE"])
+
+def ingredient_recipe_counts():
+    """(name, recipe_count) for every row of the ingredients table"""
+    from models import Ingredient, RecipeIngredient
+    return (db.session.query(Ingredient.name, db.func.count(db.distinct(RecipeIngredient.recipe_id)))
+            .outerjoin(RecipeIngredient).group_by(Ingredient.id, Ingredient.name).all())
+
+def build_ingredient_lexicon(previous=None):
+    """Build the ingredient lexicon from the database, for engines that keep no catalog snapshot"""
+    from models import get_catalog_version
+    with app.app_context():
+        version = get_catalog_version()
+        counts = ingredient_recipe_counts()
+    return IngredientLexicon(version, counts)
+
+# The SQL engine's typo correction and autocomplete, rebuilt in the background like the snapshot
+lexicon_cache = CatalogCache(read_catalog_version, build_ingredient_lexicon,
+                             check_interval=app.config["CATALOG_CHECK_INTERVAL"], name='ingredient lexicon')
+
+# Ranked matches by canonical search; favorites are applied per request on top
+search_cache = SearchResultCache(max_entries=app.config["SEARCH_CACHE_SIZE"])
+
+batch_ranker = BatchRanker(scoring_engine, processes=app.config["BATCH_SEARCH_PROCESSES"])
+atexit.register(batch_ranker.shutdown)
+
+# Favorite recipe ids by user, kept server-side so the session cookie stays small
+favorites_cache = FavoriteIdsCache(max_entries=app.config["FAVORITES_CACHE_SIZE"])
+
+instruction_cache = InstructionCache(DatabaseInstructionStore(),
+                                     max_entries=app.config["AI_CACHE_SIZE"],
+                                     ttl=app.config["AI_CACHE_TTL"])
+
+# Client for streamed instructions; None uses openai_helper's client (tests swap in a fake)
+instruction_stream_client = None
+
+def preload_catalog(path=None):
+    """Load the prebuilt catalog artifact so workers forked afterwards share it copy-on-write"""
+    path = path or app.config["CATALOG_ARTIFACT"]
+    if not path or not scoring_engine.uses_snapshot:
+        return None
+    try:
+        snapshot = load_snapshot(path)
+    except Exception as e:
+        logging.error(f"Error loading catalog artifact {path}: {e}")
+        return None
     
-    return filtered
+    prepare = getattr(scoring_engine, 'prepare', None)
+    if prepare is not None:
+        prepare(snapshot)
+    catalog_cache.preload(snapshot)
+    # Keep the garbage collector from touching (and so copying) the shared pages
+    gc.freeze()
+    logging.info(f"Loaded catalog artifact {path} at version {snapshot.version} ({len(snapshot.recipes)} recipes)")
+    return snapshot
+
+def current_catalog_version():
+    """Catalog version the workers are serving, without a query per call when a snapshot is kept"""
+    if scoring_engine.uses_snapshot:
+        return catalog_cache.get().version
+    return read_catalog_version()
+
+@app.before_request
+def start_request_metrics():
+    # Scrapes of /metrics aren't counted as traffic
+    metrics.start_request(record=request.endpoint != 'metrics_endpoint')
+
+# Registered before the other after_request hooks so it runs last and times them too
+@app.after_request
+def record_request_metrics(response):
+    """Record the request's latency, phases and SQL statements, logging it when slow"""
+    recorded = metrics.finish_request(request.endpoint or 'unmatched', request.method, response.status_code)
+    slow_ms = app.config["SLOW_REQUEST_MS"]
+    if slow_ms and recorded is not None and recorded[0] * 1000 >= slow_ms:
+        elapsed, request_metrics = recorded
+        phases = ', '.join(f"{phase} {seconds * 1000:.1f}ms" for phase, seconds in request_metrics.phases.items())
+        logging.warning(f"Slow request {request.method} {request.path}: {elapsed * 1000:.1f}ms, "
+                        f"{request_metrics.sql_statements} SQL statements in {request_metrics.sql_seconds * 1000:.1f}ms"
+                        + (f" ({phases})" if phases else ""))
+    return response
+
+def served_catalog_version():
+    snapshot = catalog_cache.peek()
+    return snapshot.version if snapshot is not None else -1
+
+# Cache and catalog state, read when /metrics is scraped
+metrics.registry.callback('vegichef_search_cache_entries', 'Ranked searches in the result cache',
+                          lambda: len(search_cache))
+metrics.registry.callback('vegichef_search_cache_hits_total', 'Search result cache hits',
+                          lambda: search_cache.hits, kind='counter')
+metrics.registry.callback('vegichef_search_cache_misses_total', 'Search result cache misses',
+                          lambda: search_cache.misses, kind='counter')
+metrics.registry.callback('vegichef_search_cache_evictions_total', 'Search results evicted or dropped on catalog changes',
+                          lambda: search_cache.evictions, kind='counter')
+metrics.registry.callback('vegichef_favorites_cache_entries', 'Users whose favorite ids are cached in this worker',
+                          lambda: len(favorites_cache))
+metrics.registry.callback('vegichef_instruction_cache_entries', 'AI instructions in the in-process cache',
+                          lambda: len(instruction_cache))
+metrics.registry.callback('vegichef_catalog_version', 'Catalog version of the snapshot being served (-1 before the first build)',
+                          served_catalog_version)
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """This worker's metrics in the Prometheus text format"""
+    return Response(metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@functools.lru_cache(maxsize=1)
+def index_page():
+    """Rendered index page and its ETag; the page doesn't depend on the catalog, so it is rendered once"""
+    # Ingredients are fetched by the page from /ingredients/suggest
+    body = render_template('index.html')
+    return body, etag_for('index', body_digest(body.encode('utf-8')))
 
 @app.route('/')
 def index():
     try:
-        from models import Ingredient
-        ingredients = Ingredient.query.all()
-        sorted_ingredients = sorted([ing.name for ing in ingredients])
-        return render_template('index.html', ingredients=sorted_ingredients)
+        body, etag = index_page()
+        response = make_response(body)
+        response.set_etag(etag, weak=True)
+        # Browsers may keep the page but must revalidate it
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+    except Exception as e:
+        logging.error(f"Error rendering index: {e}")
+        return render_template('index.html')
+
+def current_ingredient_lexicon(snapshot=None):
+    """Typo correction and autocomplete index of the catalog being served
+
+    Snapshot engines get it from the snapshot; the SQL engine, which keeps no
+    snapshot, from a cache of just the lexicon. Both are rebuilt in the background.
+    """
+    if snapshot is not None:
+        return snapshot.lexicon
+    if scoring_engine.uses_snapshot:
+        return catalog_cache.get().lexicon
+    return lexicon_cache.get()
+
+@app.route('/ingredients/suggest', methods=['GET'])
+def suggest_ingredients():
+    """Ingredient completions for ?q=, most used first; an empty q lists the most used ingredients"""
+    try:
+        prefix = request.args.get('q', '')
+        limit = min(max(request.args.get('limit', 10, type=int), 1), MAX_SUGGESTIONS)
+        
+        lexicon = current_ingredient_lexicon()
+        suggestions = lexicon.suggester.suggest(prefix, limit)
+        
+        response = jsonify({'suggestions': [{'name': name, 'recipes': count} for name, count in suggestions]})
+        response.set_etag(etag_for('suggest', lexicon.version, prefix, limit), weak=True)
+        response.cache_control.public = True
+        response.cache_control.max_age = 60
+        return response.make_conditional(request)
+        
     except Exception as e:
-        logging.error(f"Error loading ingredients: {e}")
-        return render_template('index.html', ingredients=[])
+        logging.error(f"Error in suggest_ingredients: {str(e)}")
+        return jsonify({'error': 'Failed to load ingredient suggestions'}), 500
+
+@app.after_request
+def compress(response):
+    """Compress large text responses for clients that accept gzip or brotli"""
+    return compress_response(response, request.accept_encodings,
+                             min_size=app.config["COMPRESS_MIN_SIZE"], level=app.config["COMPRESS_LEVEL"])
+
+EMPTY_PANTRY_MESSAGE = 'Please select some ingredients first!'
+NO_MATCHES_MESSAGE = 'No recipes found with your ingredients. Try adding more ingredients or adjusting filters!'
+
+def correct_search_terms(lexicon, user_ingredients):
+    """Swap misspelt ingredients for the closest known ones; returns the terms and the corrections made"""
+    user_ingredients, corrections = lexicon.speller.correct_terms(user_ingredients)
+    # replaced is False when the term was kept alongside its correction
+    return user_ingredients, [{'term': term, 'ingredient': ingredient, 'replaced': replaced}
+                              for term, ingredient, replaced in corrections]
 
 @app.route('/search_recipes', methods=['POST'])
 def search_recipes():
@@ -124,46 +299,193 @@ def search_recipes():
         meal_type = data.get('meal_type', 'All')
         
         if not user_ingredients:
-            return jsonify({'recipes': [], 'message': 'Please select some ingredients first!'})
+            return jsonify({'recipes': [], 'message': EMPTY_PANTRY_MESSAGE})
         
-        recipes = load_recipes()
+        # The SQL engine ranks inside the database and never loads the catalog
+        with metrics.request_phase('catalog'):
+            snapshot = catalog_cache.get() if scoring_engine.uses_snapshot else None
+            version = snapshot.version if snapshot is not None else read_catalog_version()
         
-        # Apply filters
-        filtered_recipes = filter_recipes(recipes, filters, meal_type)
+        # Misspelt ingredients no ingredient name contains are corrected to the closest known one
+        with metrics.request_phase('spelling'):
+            user_ingredients, corrections = correct_search_terms(current_ingredient_lexicon(snapshot), user_ingredients)
         
-        # Calculate matches and sort
-        recipe_matches = []
-        for recipe in filtered_recipes:
-            match_percentage = calculate_match_percentage(user_ingredients, recipe.get("ingredients", []))
-            
-            # Only include recipes with at least 30% match
-            if match_percentage >= 30:
-                missing_ingredients = get_missing_ingredients(user_ingredients, recipe.get("ingredients", []))
-                
-                recipe_matches.append({
-                    'name': recipe.get('name', ''),
-                    'ingredients': recipe.get('ingredients', []),
-                    'time': recipe.get('time', ''),
-                    'steps': recipe.get('steps', []),
-                    'type': recipe.get('type', ''),
-                    'tags': recipe.get('tags', []),
-                    'match_percentage': match_percentage,
-                    'missing_ingredients': missing_ingredients
-                })
-        
-        # Sort by match percentage (highest first) and limit to top 10
-        recipe_matches.sort(key=lambda x: x['match_percentage'], reverse=True)
-        top_recipes = recipe_matches[:10]
+        # Filter, score and keep the top 10 recipes with at least 30% match
+        with metrics.request_phase('rank'):
+            search = canonical_search(user_ingredients, filters, meal_type)
+            top_recipes = search_cache.get(version, search)
+            if top_recipes is None:
+                top_recipes = scoring_engine.rank(snapshot, user_ingredients, filters, meal_type)
+                search_cache.put(version, search, top_recipes)
         
         if not top_recipes:
-            return jsonify({'recipes': [], 'message': 'No recipes found with your ingredients. Try adding more ingredients or adjusting filters!'})
+            return jsonify(search_results_dict([], NO_MATCHES_MESSAGE, corrections=corrections))
         
-        return jsonify({'recipes': top_recipes, 'message': f'Found {len(top_recipes)} recipes!'})
+        with metrics.request_phase('favorites'):
+            favorite_ids = get_favorite_recipe_ids()
+        with metrics.request_phase('render'):
+            response = search_results_response(top_recipes, f'Found {len(top_recipes)} recipes!', snapshot,
+                                               favorite_ids=favorite_ids, corrections=corrections)
+            # POST responses are never answered with 304, but the ETag lets clients spot repeats
+            return with_validators(response, 'search', snapshot.version if snapshot is not None else '')
         
     except Exception as e:
         logging.error(f"Error in search_recipes: {str(e)}")
         return jsonify({'error': 'An error occurred while searching recipes'}), 500
 
+def parse_batch_query(query):
+    """(ingredients, filters, meal_type) of one batch query, or None when it is malformed
+
+    Accepts what /search_recipes accepts: null ingredients mean an empty pantry and a null
+    meal_type means every meal type. Values /search_recipes would fail on are rejected up
+    front, so one bad query can't fail the whole batch.
+    """
+    if not isinstance(query, dict):
+        return None
+    user_ingredients = query.get('ingredients', [])
+    filters = query.get('filters', {})
+    meal_type = query.get('meal_type', 'All')
+    if user_ingredients is None:
+        user_ingredients = []
+    if (not isinstance(user_ingredients, list) or not all(isinstance(ing, str) for ing in user_ingredients)
+            or not isinstance(filters, dict) or not (meal_type is None or isinstance(meal_type, str))):
+        return None
+    tags = filters.get('tags')
+    if tags and not (isinstance(tags, str) or (isinstance(tags, list) and all(isinstance(tag, str) for tag in tags))):
+        return None
+    return user_ingredients, filters, meal_type
+
+@app.route('/search_recipes/batch', methods=['POST'])
+def search_recipes_batch():
+    """Run many searches in one call; results[i] is what /search_recipes returns for queries[i]"""
+    try:
+        data = request.get_json(silent=True) or {}
+        queries = data.get('queries')
+        limit = app.config["BATCH_SEARCH_LIMIT"]
+        if not isinstance(queries, list):
+            return jsonify({'error': 'queries must be a list of {ingredients, filters, meal_type} objects'}), 400
+        if len(queries) > limit:
+            return jsonify({'error': f'At most {limit} queries per batch'}), 400
+        parsed = [parse_batch_query(query) for query in queries]
+        invalid = [index for index, query in enumerate(parsed) if query is None]
+        if invalid:
+            return jsonify({'error': f'Invalid queries at positions {invalid[:10]}'}), 400
+        
+        # One catalog snapshot and version for the whole batch
+        with metrics.request_phase('catalog'):
+            snapshot = catalog_cache.get() if scoring_engine.uses_snapshot else None
+            version = snapshot.version if snapshot is not None else read_catalog_version()
+        
+        # Spelling-corrected terms, corrections and canonical search per query; None for empty pantries
+        with metrics.request_phase('spelling'):
+            lexicon = current_ingredient_lexicon(snapshot)
+            prepared = []
+            for user_ingredients, filters, meal_type in parsed:
+                if not user_ingredients:
+                    prepared.append(None)
+                    continue
+                user_ingredients, corrections = correct_search_terms(lexicon, user_ingredients)
+                search = canonical_search(user_ingredients, filters, meal_type)
+                prepared.append((search, (user_ingredients, filters, meal_type), corrections))
+        
+        # Each distinct search is ranked once, cached ones not at all; the rest share filter bitmaps
+        with metrics.request_phase('rank'):
+            ranked = {}
+            pending = {}
+            for item in prepared:
+                if item is None or item[0] in ranked or item[0] in pending:
+                    continue
+                search, query, _ = item
+                matches = search_cache.get(version, search)
+                if matches is None:
+                    pending[search] = query
+                else:
+                    ranked[search] = matches
+            for search, matches in zip(pending, batch_ranker.rank(snapshot, list(pending.values()))):
+                search_cache.put(version, search, matches)
+                ranked[search] = matches
+        
+        with metrics.request_phase('favorites'):
+            favorite_ids = get_favorite_recipe_ids()
+        with metrics.request_phase('render'):
+            results = []
+            for item in prepared:
+                if item is None:
+                    results.append(([], EMPTY_PANTRY_MESSAGE, None))
+                    continue
+                search, _, corrections = item
+                matches = ranked[search]
+                results.append((matches, f'Found {len(matches)} recipes!' if matches else NO_MATCHES_MESSAGE,
+                                corrections))
+            
+            if snapshot is not None and splices_json():
+                body = b'{"results":[' + b','.join(
+                    search_results_body(matches, message, snapshot, favorite_ids, corrections)
+                    for matches, message, corrections in results) + b']}\n'
+                response = app.response_class(body, mimetype=app.json.mimetype)
+            else:
+                response = jsonify({'results': [search_results_dict(matches, message, favorite_ids, corrections)
+                                                 for matches, message, corrections in results]})
+            return with_validators(response, 'search-batch', snapshot.version if snapshot is not None else '')
+        
+    except Exception as e:
+        logging.error(f"Error in search_recipes_batch: {str(e)}")
+        return jsonify({'error': 'An error occurred while searching recipes'}), 500
+
+def search_result_dict(match, favorite_ids=frozenset()):
+    """Search result entry for one RecipeMatch"""
+    recipe = match.recipe
+    return {
+        'id': recipe.get('id'),
+        'name': recipe.get('name', ''),
+        'ingredients': recipe.get('ingredients', []),
+        'time': recipe.get('time', ''),
+        'steps': recipe.get('steps', []),
+        'type': recipe.get('type', ''),
+        'tags': recipe.get('tags', []),
+        'match_percentage': match.match_percentage,
+        'missing_ingredients': match.missing_ingredients,
+        'is_favorite': recipe.get('id') in favorite_ids
+    }
+
+def search_results_dict(matches, message, favorite_ids=frozenset(), corrections=None):
+    """Search results object: recipes, message and, when there are some, spelling corrections"""
+    results = {'recipes': [search_result_dict(match, favorite_ids) for match in matches], 'message': message}
+    if corrections:
+        results['corrections'] = corrections
+    return results
+
+def splices_json():
+    """Whether app.json encodes like encode_json, so pre-encoded payloads can be spliced in"""
+    json_provider = app.json
+    compact = json_provider.compact or (json_provider.compact is None and not app.debug)
+    return bool(compact and json_provider.ensure_ascii and json_provider.sort_keys)
+
+def search_results_body(matches, message, snapshot, favorite_ids=frozenset(), corrections=None):
+    """search_results_dict() encoded as jsonify would (less its newline), reusing pre-encoded payloads"""
+    # Only the per-request fields are encoded here
+    recipes = b','.join(snapshot.payload(match.position).render({
+        'is_favorite': match.recipe.get('id') in favorite_ids,
+        'match_percentage': match.match_percentage,
+        'missing_ingredients': match.missing_ingredients,
+    }) for match in matches)
+    head = {'corrections': corrections, 'message': message} if corrections else {'message': message}
+    return encode_json(head)[:-1] + b',"recipes":[' + recipes + b']}'
+
+def search_results_response(matches, message, snapshot=None, favorite_ids=frozenset(), corrections=None):
+    """JSON response for search results, reusing pre-encoded recipe payloads when possible"""
+    if snapshot is None or not splices_json():
+        return jsonify(search_results_dict(matches, message, favorite_ids, corrections))
+    body = search_results_body(matches, message, snapshot, favorite_ids, corrections) + b'\n'
+    return app.response_class(body, mimetype=app.json.mimetype)
+
+def with_validators(response, *parts):
+    """Attach a weak ETag built from parts and the body, plus per-user cache headers"""
+    response.set_etag(etag_for(*parts, body_digest(response.get_data())), weak=True)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
 @app.route('/get_ai_instructions', methods=['POST'])
 def get_ai_instructions():
     try:
@@ -176,7 +498,9 @@ def get_ai_instructions():
             return jsonify({'error': 'Recipe name is required'}), 400
         
         # Get AI-powered cooking instructions
-        ai_instructions = get_cooking_instructions(recipe_name, user_ingredients, recipe_ingredients)
+        with metrics.request_phase('instructions'):
+            ai_instructions = get_cooking_instructions(recipe_name, user_ingredients, recipe_ingredients,
+                                                       cache=instruction_cache)
         
         return jsonify({'instructions': ai_instructions})
         
@@ -185,6 +509,170 @@ def get_ai_instructions():
         return jsonify({'error': 'Failed to get AI cooking instructions. Please try again.'}), 500
 
 
+def server_sent_event(event, data):
+    """Format one Server-Sent Event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def cached_instruction_events(instructions):
+    """Replay stored instructions as the section events a live stream would have sent"""
+    for section, value in instructions.items():
+        if isinstance(value, list):
+            for item in value:
+                yield server_sent_event('section', {'section': section, 'item': item})
+        else:
+            yield server_sent_event('section', {'section': section, 'value': value})
+    yield server_sent_event('done', {'instructions': instructions})
+
+def instruction_error_event(error):
+    """Fallback instructions for a failed stream, as an error event"""
+    if isinstance(error, json.JSONDecodeError):
+        logging.error(f"Failed to parse streamed AI response as JSON: {error}")
+        message = "Sorry, I couldn't get proper cooking instructions right now. Please try again."
+    else:
+        logging.error(f"Error streaming AI cooking instructions: {error}")
+        message = "Sorry, I couldn't connect to get cooking instructions right now. Please try again later."
+    return server_sent_event('error', {'instructions': fallback_instructions(message)})
+
+def instruction_events(recipe_name, user_ingredients, recipe_ingredients):
+    """Yield AI instructions as Server-Sent Events, one per completed item
+
+    Identical prompts share one upstream stream, like get_cooking_instructions: the first
+    request streams and caches the answer, the others wait for it and replay it.
+    """
+    # Flush headers straight away so the browser can start listening
+    yield ": streaming\n\n"
+    
+    key = instruction_cache_key(recipe_name, missing_ingredients_for(user_ingredients, recipe_ingredients))
+    while True:
+        instructions = instruction_cache.get(key)
+        if instructions is not None:
+            yield from cached_instruction_events(instructions)
+            return
+        future, leader = instruction_cache.claim(key)
+        if leader:
+            break
+        try:
+            instructions = future.result()
+        except ComputationAbandoned:
+            # The streaming request went away; the next waiter streams instead
+            continue
+        except Exception as e:
+            yield instruction_error_event(e)
+            return
+        yield from cached_instruction_events(instructions)
+        return
+    
+    settled = False
+    try:
+        instructions = instruction_cache.lookup(key)
+        if instructions is not None:
+            instruction_cache.settle(key, future, instructions)
+            settled = True
+            yield from cached_instruction_events(instructions)
+            return
+        
+        parser = InstructionStreamParser()
+        try:
+            for fragment in stream_cooking_instructions(recipe_name, user_ingredients, recipe_ingredients,
+                                                        stream_client=instruction_stream_client):
+                for event in parser.feed(fragment):
+                    yield server_sent_event('section', event)
+            instructions = parser.result()
+        except Exception as e:
+            instruction_cache.settle(key, future, error=e)
+            settled = True
+            yield instruction_error_event(e)
+            return
+        
+        # Only complete, valid answers are cached
+        instruction_cache.remember(key, instructions, recipe_name=recipe_name)
+        instruction_cache.settle(key, future, instructions)
+        settled = True
+        yield server_sent_event('done', {'instructions': instructions})
+    finally:
+        # Reached without settling when the client disconnects mid-stream; waiters take over
+        if not settled:
+            instruction_cache.settle(key, future, error=ComputationAbandoned(key))
+
+
+@app.route('/get_ai_instructions/stream', methods=['POST'])
+def stream_ai_instructions():
+    """Stream AI cooking instructions as Server-Sent Events"""
+    data = request.get_json(silent=True) or {}
+    recipe_name = data.get('recipe_name', '')
+    user_ingredients = data.get('user_ingredients', [])
+    recipe_ingredients = data.get('recipe_ingredients', [])
+    
+    if not recipe_name:
+        return jsonify({'error': 'Recipe name is required'}), 400
+    
+    return Response(
+        stream_with_context(instruction_events(recipe_name, user_ingredients, recipe_ingredients)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+def write_last_active(rows):
+    """Persist a batch of last_active timestamps with one executemany UPDATE"""
+    from models import User
+    users = User.__table__
+    statement = (users.update()
+                 .where(users.c.id == db.bindparam('user_id'))
+                 .values(last_active=db.bindparam('last_active')))
+    with db.engine.begin() as connection:
+        connection.execute(statement, rows)
+
+last_active_tracker = LastActiveTracker(write_last_active,
+                                        flush_interval=app.config["LAST_ACTIVE_FLUSH_INTERVAL"])
+def flush_last_active():
+    """Write pending last_active timestamps; db.engine needs an app context at exit too"""
+    with app.app_context():
+        last_active_tracker.flush()
+
+# Don't lose the last interval's activity on shutdown
+atexit.register(flush_last_active)
+
+@app.after_request
+def record_user_activity(response):
+    """Note activity for known users; the database only sees periodic batches"""
+    user_id = session.get('user_id')
+    if user_id is not None:
+        last_active_tracker.touch(user_id)
+    last_active_tracker.flush_if_due()
+    return response
+
+
+def get_current_user_id():
+    """Id of the session's user, or None for visitors who never saved anything"""
+    return session.get('user_id')
+
+
+def get_favorite_recipe_ids():
+    """Ids of the session user's favorite recipes, cached in this worker between requests"""
+    from models import UserFavorite
+    
+    user_id = get_current_user_id()
+    if user_id is None:
+        return frozenset()
+    
+    token = session.get('favorites_token')
+    favorite_ids = favorites_cache.get(user_id, token) if token is not None else None
+    if favorite_ids is None:
+        favorite_ids = [recipe_id for (recipe_id,) in db.session.query(UserFavorite.recipe_id)
+                        .filter(UserFavorite.user_id == user_id)]
+        if token is None:
+            token = session['favorites_token'] = new_favorites_token()
+        favorite_ids = favorites_cache.put(user_id, token, favorite_ids)
+    return favorite_ids
+
+
+def set_favorite_recipe_ids(favorite_ids):
+    """Cache the user's favorite ids after a write, under a new token so other workers reload theirs"""
+    token = session['favorites_token'] = new_favorites_token()
+    favorites_cache.put(get_current_user_id(), token, favorite_ids)
+
+
 def get_or_create_user():
     """Get or create user based on session"""
     from models import User
@@ -197,6 +685,7 @@ def get_or_create_user():
         db.session.add(user)
         db.session.commit()
         session['user_id'] = user.id
+        session.pop('favorites_token', None)
         return user
     else:
         user = User.query.get(session['user_id'])
@@ -208,6 +697,7 @@ def get_or_create_user():
             db.session.add(user)
             db.session.commit()
             session['user_id'] = user.id
+            session.pop('favorites_token', None)
         return user
 
 
@@ -249,6 +739,14 @@ def toggle_favorite():
         
         db.session.commit()
         
+        # Keep the cached favorite ids in step so search results stay accurate
+        favorite_ids = set(get_favorite_recipe_ids())
+        if is_favorite:
+            favorite_ids.add(recipe.id)
+        else:
+            favorite_ids.discard(recipe.id)
+        set_favorite_recipe_ids(favorite_ids)
+        
         return jsonify({'is_favorite': is_favorite})
         
     except Exception as e:
@@ -257,22 +755,66 @@ def toggle_favorite():
         return jsonify({'error': 'Failed to toggle favorite'}), 500
 
 
-@app.route('/get_favorites', methods=['GET'])
-def get_favorites():
-    """Get user's favorite recipes"""
+@app.route('/update_favorites', methods=['POST'])
+def update_favorites():
+    """Apply a batch of favorite add/remove operations keyed by recipe id"""
     try:
-        from models import Recipe, UserFavorite
+        from models import apply_favorite_changes
+        
+        data = request.get_json(silent=True) or {}
+        operations = data.get('operations', [])
+        
+        if not isinstance(operations, list) or not operations:
+            return jsonify({'error': 'At least one operation is required'}), 400
+        if len(operations) > app.config["FAVORITES_BATCH_LIMIT"]:
+            return jsonify({'error': f'At most {app.config["FAVORITES_BATCH_LIMIT"]} operations per request'}), 400
+        
+        # The last operation on a recipe wins
+        actions = {}
+        for operation in operations:
+            recipe_id = operation.get('recipe_id') if isinstance(operation, dict) else None
+            action = operation.get('action') if isinstance(operation, dict) else None
+            if not isinstance(recipe_id, int) or isinstance(recipe_id, bool) or action not in ('add', 'remove'):
+                return jsonify({'error': 'Each operation needs an integer recipe_id and an action of "add" or "remove"'}), 400
+            actions[recipe_id] = action
         
         user = get_or_create_user()
+        favorite_ids = apply_favorite_changes(
+            user.id,
+            add_ids=[recipe_id for recipe_id, action in actions.items() if action == 'add'],
+            remove_ids=[recipe_id for recipe_id, action in actions.items() if action == 'remove'])
+        db.session.commit()
         
-        # Get user's favorite recipes
-        favorites = db.session.query(Recipe).join(UserFavorite).filter(
-            UserFavorite.user_id == user.id
-        ).all()
+        set_favorite_recipe_ids(favorite_ids)
+        return jsonify({'favorite_ids': favorite_ids})
+        
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error in update_favorites: {str(e)}")
+        return jsonify({'error': 'Failed to update favorites'}), 500
+
+
+@app.route('/get_favorites', methods=['GET'])
+def get_favorites():
+    """Get user's favorite recipes"""
+    try:
+        from models import load_recipe_dicts
         
-        favorite_recipes = [recipe.to_dict() for recipe in favorites]
+        # Anonymous visitors have no favorites and don't need a user row yet
+        user_id = get_current_user_id()
+        favorite_ids = get_favorite_recipe_ids() if user_id is not None else frozenset()
         
-        return jsonify({'recipes': favorite_recipes})
+        # The ETag only depends on the catalog and the favorite ids, so a repeat visit skips loading recipes
+        etag = etag_for('favorites', current_catalog_version(), user_id, sorted(favorite_ids))
+        if request.if_none_match.contains_weak(etag):
+            response = make_response('', 304)
+        else:
+            favorite_recipes = load_recipe_dicts(sorted(favorite_ids)) if favorite_ids else []
+            response = jsonify({'recipes': favorite_recipes})
+        response.set_etag(etag, weak=True)
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response
         
     except Exception as e:
         logging.error(f"Error in get_favorites: {str(e)}")
@@ -288,11 +830,14 @@ def check_favorites():
         data = request.get_json()
         recipe_names = data.get('recipe_names', [])
         
-        user = get_or_create_user()
+        # Anonymous visitors have no favorites and don't need a user row yet
+        user_id = get_current_user_id()
+        if user_id is None:
+            return jsonify({'favorited_recipes': []})
         
         # Get favorited recipe names
         favorited_recipes = db.session.query(Recipe.name).join(UserFavorite).filter(
-            UserFavorite.user_id == user.id,
+            UserFavorite.user_id == user_id,
             Recipe.name.in_(recipe_names)
         ).all()
         
@@ -305,4 +850,6 @@ def check_favorites():
         return jsonify({'error': 'Failed to check favorites'}), 500
 
 if __name__ == '__main__':
+    init_db()
+    preload_catalog()
     app.run(host='0.0.0.0', port=5000, debug=True)
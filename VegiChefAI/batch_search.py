@@ -0,0 +1,88 @@
+"""
+Ranking batches of searches against one catalog snapshot, optionally across worker processes
+"""
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from scoring import RecipeMatch, rank_many
+
+# Batches smaller than this are ranked in-process even when a pool is configured
+MIN_PARALLEL_BATCH = 64
+
+# Engine and snapshot of the current pool, set before its processes fork so they inherit them
+_fork_state = {}
+
+
+def _init_worker():
+    _fork_state['snapshot'].resolver.reset_lock()
+
+
+def _rank_chunk(version, searches):
+    engine, snapshot = _fork_state['engine'], _fork_state['snapshot']
+    # A process forked after the pool was replaced may hold a newer snapshot
+    if snapshot.version != version:
+        raise RuntimeError(f"worker holds catalog version {snapshot.version}, batch needs {version}")
+    # Positions instead of recipes keep the results small to send back
+    return [[(match.position, match.match_percentage, match.missing_ingredients) for match in matches]
+            for matches in rank_many(engine, snapshot, searches)]
+
+
+class BatchRanker:
+    """Ranks batches of searches, spreading large ones over forked processes that share the snapshot
+
+    Processes are forked once per snapshot, so the catalog (frozen out of the garbage
+    collector by preload_catalog) is shared copy-on-write rather than pickled per batch.
+    """
+
+    def __init__(self, engine, processes=0, min_parallel=MIN_PARALLEL_BATCH):
+        self.engine = engine
+        self.processes = processes
+        self.min_parallel = min_parallel
+        self._pool = None
+        self._pool_snapshot = None
+        self._lock = threading.Lock()
+
+    def rank(self, snapshot, searches):
+        """RecipeMatch lists for (user_ingredients, filters, meal_type) searches, in order"""
+        if snapshot is None or self.processes < 2 or len(searches) < self.min_parallel:
+            return rank_many(self.engine, snapshot, searches)
+
+        chunk_size = -(-len(searches) // self.processes)
+        chunks = [searches[start:start + chunk_size] for start in range(0, len(searches), chunk_size)]
+        try:
+            pool = self._get_pool(snapshot)
+            futures = [pool.submit(_rank_chunk, snapshot.version, chunk) for chunk in chunks]
+            ranked = [matches for future in futures for matches in future.result()]
+        except Exception as e:
+            logging.error(f"Error ranking batch in worker processes, ranking in-process: {e}")
+            return rank_many(self.engine, snapshot, searches)
+
+        return [[RecipeMatch(snapshot.recipes[position], match_percentage, missing_ingredients, position)
+                 for position, match_percentage, missing_ingredients in matches]
+                for matches in ranked]
+
+    def _get_pool(self, snapshot):
+        with self._lock:
+            if self._pool is not None and self._pool_snapshot is snapshot:
+                return self._pool
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+            # Build engine state up front so forked processes never build or lock it
+            prepare = getattr(self.engine, 'prepare', None)
+            if prepare is not None:
+                prepare(snapshot)
+            _fork_state.update(engine=self.engine, snapshot=snapshot)
+            self._pool = ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context('fork'),
+                                             initializer=_init_worker)
+            self._pool_snapshot = snapshot
+            return self._pool
+
+    def shutdown(self):
+        """Stop the worker processes"""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+                self._pool_snapshot = None
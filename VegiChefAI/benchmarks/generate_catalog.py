@@ -0,0 +1,111 @@
+"""
+Synthetic recipe catalogs in the shape of recipes.json
+
+Ingredient use follows a Zipf distribution over a vocabulary that grows with the
+catalog: the real recipes.json ingredients come first and are the most common,
+followed by generated variants ("roasted cumin", "fresh coriander leaves"...).
+Tags, meal types and list lengths follow the proportions of recipes.json.
+"""
+import json
+import random
+import argparse
+from itertools import accumulate
+
+SIZES = {'1k': 1_000, '10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+
+BASE_INGREDIENTS = [
+    'onion', 'salt', 'oil', 'cumin seeds', 'ginger', 'turmeric', 'green chili', 'tomato', 'red chili powder',
+    'garam masala', 'coriander', 'garlic', 'potato', 'ghee', 'mustard seeds', 'curry leaves', 'hing', 'curd',
+    'paneer', 'rice', 'wheat flour', 'besan', 'lemon juice', 'sugar', 'cumin powder', 'coriander powder',
+    'cream', 'butter', 'peas', 'cauliflower', 'spinach', 'cashews', 'cardamom', 'milk', 'jaggery', 'tamarind',
+    'coconut', 'semolina', 'poha', 'toor dal', 'moong dal', 'urad dal', 'chana dal', 'bay leaf', 'cinnamon',
+    'cloves', 'black pepper', 'okra', 'brinjal', 'capsicum', 'carrot', 'beans', 'cabbage', 'corn', 'kasuri methi',
+    'amchur', 'fenugreek seeds', 'basmati rice', 'saffron', 'rajma', 'chickpeas', 'bottle gourd', 'methi leaves',
+]
+VARIANT_PREFIXES = ['fresh', 'roasted', 'dried', 'ground', 'chopped', 'grated', 'crushed', 'whole', 'boiled',
+                    'sprouted', 'organic', 'baby', 'red', 'green', 'black', 'white', 'kashmiri', 'malabar']
+VARIANT_SUFFIXES = ['powder', 'paste', 'leaves', 'seeds', 'flakes', 'oil', 'puree', 'chunks']
+
+# Tag and meal type frequencies, roughly those of recipes.json
+TAGS = [('Healthy', 0.45), ('Quick', 0.35), ('Comfort Food', 0.25), ('Satvik', 0.2), ('Protein Rich', 0.2),
+        ('Jain', 0.1), ('No Onion/Garlic', 0.1), ('Spicy', 0.15), ('Festive', 0.05)]
+TYPES = [('Lunch', 0.4), ('Breakfast', 0.3), ('Dinner', 0.2), ('Snacks', 0.1)]
+DISH_WORDS = ['Aloo', 'Paneer', 'Masala', 'Dal', 'Sabzi', 'Pulao', 'Paratha', 'Curry', 'Tikki', 'Khichdi',
+              'Upma', 'Chaat', 'Kofta', 'Raita', 'Halwa', 'Dosa', 'Idli', 'Poha', 'Bhaji', 'Korma']
+
+
+def vocabulary(size, rng):
+    """Ingredient names for a catalog of size recipes, most common first"""
+    target = max(len(BASE_INGREDIENTS), int(20 * size ** 0.5))
+    names = list(BASE_INGREDIENTS)
+    seen = set(names)
+    while len(names) < target:
+        base = rng.choice(BASE_INGREDIENTS)
+        name = f"{rng.choice(VARIANT_PREFIXES)} {base}" if rng.random() < 0.6 else f"{base} {rng.choice(VARIANT_SUFFIXES)}"
+        if rng.random() < 0.2:
+            name = f"{rng.choice(VARIANT_PREFIXES)} {name}"
+        if name not in seen:
+            seen.add(name)
+            names.append(name)
+    return names
+
+
+def zipf_weights(count, exponent=1.1):
+    """Cumulative Zipf weights for ranks 1..count"""
+    return list(accumulate(1.0 / rank ** exponent for rank in range(1, count + 1)))
+
+
+def generate_recipes(size, seed=42):
+    """Yield size synthetic recipes"""
+    rng = random.Random(seed)
+    names = vocabulary(size, rng)
+    weights = zipf_weights(len(names))
+
+    for index in range(size):
+        count = min(max(int(rng.gauss(12, 3)), 3), 20)
+        ingredients = list(dict.fromkeys(rng.choices(names, cum_weights=weights, k=count)))
+        # Some recipes spell ingredients in title case, as hand-written catalogs do
+        if rng.random() < 0.1:
+            ingredients = [ingredient.title() for ingredient in ingredients]
+        steps = [f"Step {step + 1}: cook the {rng.choice(ingredients)} until done"
+                 for step in range(rng.randint(4, 10))]
+        yield {
+            'name': f"{rng.choice(DISH_WORDS)} {rng.choice(DISH_WORDS)} {index}",
+            'ingredients': ingredients,
+            'time': f"{rng.choice([10, 15, 20, 25, 30, 40, 45, 60, 90])} min",
+            'steps': steps,
+            'type': rng.choices([recipe_type for recipe_type, _ in TYPES],
+                                weights=[weight for _, weight in TYPES])[0],
+            'tags': [tag for tag, probability in TAGS if rng.random() < probability],
+        }
+
+
+def write_catalog(path, size, seed=42):
+    """Write a synthetic catalog as JSONL (one recipe per line), or as a JSON array for .json paths"""
+    with open(path, 'w', encoding='utf-8') as f:
+        if path.endswith('.json'):
+            f.write('[\n')
+            for index, recipe in enumerate(generate_recipes(size, seed)):
+                f.write((',\n' if index else '') + json.dumps(recipe))
+            f.write('\n]\n')
+        else:
+            for recipe in generate_recipes(size, seed):
+                f.write(json.dumps(recipe) + '\n')
+    return path
+
+
+def parse_size(value):
+    """'10k', '1m' or a plain number of recipes"""
+    value = value.lower()
+    return SIZES[value] if value in SIZES else int(value)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('size', type=parse_size, help='number of recipes: 1k, 10k, 100k, 1m or a number')
+    parser.add_argument('path', help='output file; .json writes an array, anything else JSONL')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    write_catalog(args.path, args.size, args.seed)
+    print(f"Wrote {args.size} recipes to {args.path}")
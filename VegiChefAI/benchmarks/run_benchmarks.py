@@ -0,0 +1,300 @@
+"""
+Benchmarks for search, recipe loading, serialization and import on synthetic catalogs
+
+Each catalog size runs in its own process against a fresh SQLite database:
+
+    python benchmarks/run_benchmarks.py --sizes 1k 10k
+    python benchmarks/run_benchmarks.py --sizes 1k 10k --save baseline.json
+    python benchmarks/run_benchmarks.py --sizes 1k 10k --compare baseline.json
+
+Latencies are reported as percentiles, memory as the tracemalloc peak of one extra
+run (the import reports the process's peak RSS instead). --compare exits with
+status 1 when a median of three or more runs, or a memory peak, regresses by more
+than --tolerance.
+"""
+import os
+import io
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import tempfile
+import tracemalloc
+import contextlib
+import subprocess
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from generate_catalog import generate_recipes, parse_size, write_catalog  # noqa: E402
+
+# Number of queries the load_recipe_dicts() layer must issue, whatever the catalog size
+LOADER_QUERY_COUNT = 4
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an ascending list"""
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def summarize(timings, peak_bytes=None):
+    """Percentiles in milliseconds, plus the memory peak in MB when measured"""
+    timings = sorted(timings)
+    stats = {
+        'n': len(timings),
+        'p50_ms': percentile(timings, 0.50) * 1000,
+        'p95_ms': percentile(timings, 0.95) * 1000,
+        'p99_ms': percentile(timings, 0.99) * 1000,
+        'mean_ms': sum(timings) / len(timings) * 1000,
+    }
+    if peak_bytes is not None:
+        stats['peak_mb'] = peak_bytes / 1e6
+    return stats
+
+
+def measure(fn, inputs, memory=True):
+    """Time fn over every input, then trace the memory peak of one more call"""
+    timings = []
+    for value in inputs:
+        started = time.perf_counter()
+        fn(value)
+        timings.append(time.perf_counter() - started)
+    peak = None
+    if memory:
+        tracemalloc.start()
+        fn(inputs[0])
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return summarize(timings, peak)
+
+
+def sample_searches(size, count, seed=7):
+    """Search requests with Zipf-weighted pantries, as users mostly pick common ingredients"""
+    rng = random.Random(seed)
+    names = sorted({ingredient.lower() for recipe in generate_recipes(min(size, 2000), seed=42)
+                    for ingredient in recipe['ingredients']})
+    searches = []
+    for _ in range(count):
+        filters = {flag: rng.random() < 0.1 for flag in ('no_onion_garlic', 'jain', 'satvik', 'quick', 'healthy')}
+        searches.append({
+            'ingredients': rng.sample(names, rng.randint(3, 8)),
+            'filters': filters,
+            'meal_type': rng.choice(['All', 'All', 'Breakfast', 'Lunch', 'Dinner', 'Snacks']),
+        })
+    return searches
+
+
+def sample_typos(names, count, seed=11):
+    """Ingredient names with one character dropped, doubled or swapped with its neighbour"""
+    rng = random.Random(seed)
+    names = sorted(name for name in names if len(name) >= 5)
+    typos = []
+    for name in rng.choices(names, k=count):
+        index = rng.randrange(len(name) - 1)
+        typos.append(rng.choice([
+            name[:index] + name[index + 1:],
+            name[:index] + name[index] + name[index:],
+            name[:index] + name[index + 1] + name[index] + name[index + 2:],
+        ]))
+    return typos
+
+
+def run_size(catalog_path, size, queries, memory):
+    """Run every benchmark for one catalog in this process; DATABASE_URL must already point at it"""
+    sys.path.insert(0, APP_DIR)
+    import app as app_module
+    import migrate_data
+    from app import app, db, load_recipes
+    from catalog import load_snapshot, save_snapshot
+    from models import Recipe, load_recipe_dicts, recipe_loader_options
+    from scoring import calculate_match_percentage, filter_recipes, get_missing_ingredients
+    from sqlalchemy import event
+
+    results = {}
+
+    # Import
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        migrate_data.migrate_json_to_database(catalog_path, batch_size=2000)
+    results['import'] = summarize([time.perf_counter() - started])
+    results['import']['recipes_per_s'] = size / (time.perf_counter() - started)
+    results['import']['peak_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    with app.app_context():
+        # The loader issues a fixed number of queries however many recipes it loads
+        statements = []
+
+        def count_statement(*args):
+            statements.append(args)
+
+        event.listen(db.engine, 'before_cursor_execute', count_statement)
+        for recipe_ids in (None, list(range(1, 51)), [1]):
+            statements.clear()
+            load_recipe_dicts(recipe_ids)
+            assert len(statements) == LOADER_QUERY_COUNT, (
+                f"load_recipe_dicts({'all' if recipe_ids is None else len(recipe_ids)}) issued "
+                f"{len(statements)} queries, expected {LOADER_QUERY_COUNT}")
+        event.remove(db.engine, 'before_cursor_execute', count_statement)
+        results['loader_queries'] = {'queries': LOADER_QUERY_COUNT}
+
+        repeats = 5 if size <= 10_000 else 2
+        results['load_recipes'] = measure(lambda _: load_recipes(), [None] * repeats, memory)
+
+        batch = Recipe.query.options(*recipe_loader_options()).order_by(Recipe.id).limit(1000).all()
+        results['to_dict_1000'] = measure(lambda _: [recipe.to_dict() for recipe in batch], [None] * 20, memory)
+        db.session.remove()
+
+    # The original per-request algorithm over the loaded list
+    with app.app_context():
+        recipes = load_recipes()
+        assert len(recipes) == size, f"loaded {len(recipes)} recipes, expected {size}"
+    searches = sample_searches(size, queries)
+
+    def reference_search(search):
+        matches = []
+        for recipe in filter_recipes(recipes, search['filters'], search['meal_type']):
+            percentage = calculate_match_percentage(search['ingredients'], recipe['ingredients'])
+            if percentage >= 30:
+                matches.append((percentage, get_missing_ingredients(search['ingredients'], recipe['ingredients'])))
+        matches.sort(key=lambda match: match[0], reverse=True)
+        return matches[:10]
+
+    reference_queries = max(5, min(queries, 200_000 // size))
+    results['reference_search'] = measure(reference_search, searches[:reference_queries], memory)
+    del recipes
+
+    # Full requests through Flask, result cache disabled by the parent process
+    started = time.perf_counter()
+    snapshot = app_module.catalog_cache.get() if app_module.scoring_engine.uses_snapshot else None
+    results['snapshot_build'] = summarize([time.perf_counter() - started])
+
+    client = app.test_client()
+
+    def search_request(search):
+        response = client.post('/search_recipes', json=search)
+        assert response.status_code == 200, response.get_data(as_text=True)
+
+    results['search_request'] = measure(search_request, searches, memory)
+
+    def search_batch(batch):
+        response = client.post('/search_recipes/batch', json={'queries': batch})
+        assert response.status_code == 200, response.get_data(as_text=True)
+
+    batches = [searches[start:start + 50] for start in range(0, len(searches), 50)]
+    results['search_batch_50'] = measure(search_batch, batches, memory)
+
+    # Typo correction against the ingredient vocabulary
+    speller = app_module.current_ingredient_lexicon(snapshot).speller
+    results['spelling'] = measure(lambda term: speller.correct_terms([term]),
+                                  sample_typos(speller.counts, queries), memory)
+    results['spelling']['vocabulary'] = len(speller)
+
+    # Catalog artifact serialization
+    if snapshot is not None:
+        artifact = os.path.join(tempfile.mkdtemp(), 'catalog.pickle')
+        results['artifact_save'] = measure(lambda _: save_snapshot(snapshot, artifact), [None] * 3, memory)
+        results['artifact_load'] = measure(lambda _: load_snapshot(artifact), [None] * 3, memory)
+        results['artifact_save']['size_mb'] = os.path.getsize(artifact) / 1e6
+
+    return results
+
+
+def run_in_subprocess(label, size, workdir, queries, memory):
+    """Benchmark one catalog size in a fresh interpreter and return its results"""
+    catalog_path = os.path.join(workdir, f"catalog-{label}.jsonl")
+    if not os.path.exists(catalog_path):
+        print(f"Generating {size} recipes into {catalog_path}...", file=sys.stderr)
+        write_catalog(catalog_path, size)
+    database_path = os.path.join(workdir, f"bench-{label}.db")
+    if os.path.exists(database_path):
+        os.remove(database_path)
+
+    env = dict(os.environ,
+               DATABASE_URL=f"sqlite:///{database_path}",
+               SEARCH_CACHE_SIZE="0",
+               CATALOG_CHECK_INTERVAL="3600",
+               LAST_ACTIVE_FLUSH_INTERVAL="3600")
+    command = [sys.executable, os.path.abspath(__file__), '--worker', catalog_path, '--worker-size', str(size),
+               '--queries', str(queries)] + ([] if memory else ['--no-memory'])
+    output = subprocess.run(command, env=env, cwd=APP_DIR, stdout=subprocess.PIPE, check=True).stdout
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def print_results(label, results):
+    print(f"\n== {label} ==")
+    print(f"{'benchmark':<18} {'n':>5} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'peak MB':>9}")
+    for name, stats in results.items():
+        peak = stats.get('peak_mb', stats.get('peak_rss_mb'))
+        if 'p50_ms' not in stats:
+            print(f"{name:<18} " + ', '.join(f"{key} {value}" for key, value in stats.items()))
+            continue
+        print(f"{name:<18} {stats['n']:>5} {stats['p50_ms']:>10.2f} {stats['p95_ms']:>10.2f} {stats['p99_ms']:>10.2f} "
+              f"{'' if peak is None else f'{peak:.1f}':>9}")
+
+
+def compare(current, baseline, tolerance):
+    """Print regressions against a baseline; returns True when there are none"""
+    regressions = []
+    for label, results in current.items():
+        for name, stats in results.items():
+            previous = baseline.get(label, {}).get(name)
+            if not previous:
+                continue
+            for metric in ('p50_ms', 'peak_mb'):
+                # Single-run timings (import, snapshot build) are too noisy to gate on
+                if metric == 'p50_ms' and stats.get('n', 0) < 3:
+                    continue
+                if metric in stats and previous.get(metric):
+                    ratio = stats[metric] / previous[metric]
+                    if ratio > 1 + tolerance:
+                        regressions.append(f"{label} {name} {metric}: {previous[metric]:.2f} -> {stats[metric]:.2f} "
+                                           f"({ratio:.2f}x)")
+    if regressions:
+        print("\nRegressions:")
+        for regression in regressions:
+            print(f"  {regression}")
+    else:
+        print(f"\nNo regressions beyond {tolerance:.0%} against the baseline")
+    return not regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', nargs='+', default=['1k', '10k'], help='catalog sizes: 1k, 10k, 100k, 1m')
+    parser.add_argument('--queries', type=int, default=200, help='search requests per size')
+    parser.add_argument('--workdir', default=os.path.join(tempfile.gettempdir(), 'vegichef-benchmarks'),
+                        help='where generated catalogs (reused between runs) and databases go')
+    parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc runs')
+    parser.add_argument('--save', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='baseline JSON file written by --save')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown before failing --compare')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    parser.add_argument('--worker-size', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        with contextlib.redirect_stdout(sys.stderr):
+            results = run_size(args.worker, args.worker_size, args.queries, not args.no_memory)
+        print(json.dumps(results))
+        sys.exit(0)
+
+    os.makedirs(args.workdir, exist_ok=True)
+    current = {}
+    for label in args.sizes:
+        current[label] = run_in_subprocess(label, parse_size(label), args.workdir, args.queries, not args.no_memory)
+        print_results(label, current[label])
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(current, f, indent=2)
+        print(f"\nSaved results to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if not compare(current, baseline, args.tolerance):
+            sys.exit(1)
@@ -0,0 +1,32 @@
+"""
+Build step that writes the recipe catalog snapshot to a file workers load at startup
+
+Point CATALOG_ARTIFACT at the file; workers still check the catalog version and
+rebuild in the background if the artifact is older than the database.
+"""
+import os
+import time
+import argparse
+from app import app, build_catalog_snapshot
+from catalog import save_snapshot
+
+
+def build_catalog_artifact(path):
+    """Snapshot the database catalog into a catalog artifact"""
+    started = time.monotonic()
+    snapshot = build_catalog_snapshot()
+    save_snapshot(snapshot, path)
+    elapsed = time.monotonic() - started
+    
+    print(f"Wrote {path}: catalog version {snapshot.version}, {len(snapshot.recipes)} recipes, "
+          f"{len(snapshot.resolver)} ingredients, {os.path.getsize(path) / 1e6:.1f} MB in {elapsed:.1f}s")
+    return snapshot
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('path', nargs='?', default=app.config["CATALOG_ARTIFACT"] or 'catalog.pickle',
+                        help='artifact file to write (default: $CATALOG_ARTIFACT or catalog.pickle)')
+    args = parser.parse_args()
+    
+    build_catalog_artifact(args.path)
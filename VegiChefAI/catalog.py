@@ -0,0 +1,402 @@
+"""
+In-process recipe catalog snapshot shared by the search endpoints
+"""
+import os
+import json
+import time
+import pickle
+import logging
+import threading
+from collections import OrderedDict
+
+
+def normalize_ingredient(name):
+    """Normalized ingredient name, as stored in the ingredients table"""
+    return name.lower().strip()
+
+
+def substrings(term, max_length=None):
+    """Every substring of a term, including the empty string, optionally only those up to max_length"""
+    yield ''
+    if max_length is None:
+        max_length = len(term)
+    for start in range(len(term)):
+        for end in range(start + 1, min(start + max_length, len(term)) + 1):
+            yield term[start:end]
+
+
+class IngredientResolver:
+    """Containment table mapping ingredient terms to the ingredient ids they satisfy
+
+    A term satisfies an ingredient when either name contains the other, the rule
+    calculate_match_percentage applies with string scans on every request. Ids are
+    assigned here, not taken from the ingredients table: the resolver outlives
+    re-imports that renumber that table, and an id must never name two ingredients.
+    """
+
+    def __init__(self, max_free_terms=10000):
+        self.names = {}
+        self.ids = {}
+        self.max_free_terms = max_free_terms
+        self._closures = {}
+        self._free_terms = OrderedDict()
+        self._next_id = 1
+        # Longest ingredient name; longer substrings of a term can't be ingredients
+        self.longest = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getstate__(self):
+        # Locks don't pickle, and free-text terms are a per-process cache
+        state = self.__dict__.copy()
+        del state['_lock']
+        state['_free_terms'] = OrderedDict()
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def reset_lock(self):
+        """Give a forked process its own lock; one held by another thread at fork time is never released"""
+        self._lock = threading.Lock()
+
+    def add(self, name):
+        """Add one ingredient and return its id"""
+        return self.extend([name])[0]
+
+    def extend(self, names):
+        """Add ingredient names, updating every term they satisfy; returns their ids"""
+        with self._lock:
+            result = []
+            added = {}
+            for name in names:
+                name = normalize_ingredient(name)
+                if name in self.ids:
+                    result.append(self.ids[name])
+                    continue
+                ingredient_id = self._next_id
+                self._next_id += 1
+                self.ids[name] = ingredient_id
+                self.longest = max(self.longest, len(name))
+                self.names[ingredient_id] = name
+                added[name] = ingredient_id
+                result.append(ingredient_id)
+            if added:
+                self._link(added)
+            return result
+
+    def _link(self, added):
+        closures = {}
+
+        def closure(name):
+            if name not in closures:
+                closures[name] = set(self._closures.get(name, ()))
+            return closures[name]
+
+        def link(inner, outer):
+            closure(inner).add(self.ids[outer])
+            closure(outer).add(self.ids[inner])
+
+        for name in added:
+            closure(name).add(added[name])
+            # Known ingredients contained in the new name
+            for sub in substrings(name):
+                if sub in self.ids and sub != name:
+                    link(sub, name)
+
+        # Existing ingredients containing a new name; scan whichever side is smaller
+        existing = [name for name in self.ids if name not in added]
+        if len(added) * len(existing) <= sum(len(name) ** 2 for name in existing):
+            for name in added:
+                for other in existing:
+                    if name in other:
+                        link(name, other)
+        else:
+            for other in existing:
+                for sub in substrings(other):
+                    if sub in added:
+                        link(sub, other)
+
+        for name, ids in closures.items():
+            self._closures[name] = frozenset(ids)
+
+        # Free-text terms resolved earlier may now satisfy the new ingredients too
+        for term, ids in list(self._free_terms.items()):
+            if term in added:
+                del self._free_terms[term]
+                continue
+            extra = {added[name] for name in added if term in name or name in term}
+            if extra:
+                self._free_terms[term] = ids | extra
+
+    def resolve(self, term):
+        """Ids of the ingredients a term satisfies"""
+        term = normalize_ingredient(term)
+        ids = self._closures.get(term)
+        if ids is not None:
+            return ids
+        with self._lock:
+            ids = self._free_terms.get(term)
+            if ids is not None:
+                self._free_terms.move_to_end(term)
+                return ids
+            # Bounded by the longest name, so a long free-text term costs O(len * longest)
+            ids = [self.ids[sub] for sub in substrings(term, self.longest) if sub in self.ids]
+            if len(term) <= self.longest:
+                ids.extend(ingredient_id for name, ingredient_id in self.ids.items() if term in name)
+            ids = frozenset(ids)
+            self._free_terms[term] = ids
+            if len(self._free_terms) > self.max_free_terms:
+                self._free_terms.popitem(last=False)
+            return ids
+
+
+def encode_json(obj):
+    """Encode like Flask's compact jsonify: sorted keys, ASCII only, no spaces"""
+    return json.dumps(obj, ensure_ascii=True, sort_keys=True, separators=(',', ':')).encode('ascii')
+
+
+class RecipePayload:
+    """A recipe's static search-result fields, JSON-encoded once per catalog version"""
+    __slots__ = ('head', 'tail')
+
+    def __init__(self, recipe):
+        # Keys sort as id, ingredients < (per-request fields) < name, steps, tags, time, type
+        self.head = encode_json({'id': recipe.get('id'), 'ingredients': recipe.get('ingredients', [])})[:-1]
+        self.tail = encode_json({
+            'name': recipe.get('name', ''),
+            'steps': recipe.get('steps', []),
+            'tags': recipe.get('tags', []),
+            'time': recipe.get('time', ''),
+            'type': recipe.get('type', ''),
+        })[1:]
+
+    def render(self, dynamic):
+        """Splice per-request fields (keys sorting between "ingredients" and "name") into the payload"""
+        return self.head + b',' + encode_json(dynamic)[1:-1] + b',' + self.tail
+
+
+class IngredientLexicon:
+    """Typo correction and autocomplete over a catalog's ingredients, ranked by recipe count"""
+
+    def __init__(self, version, counts):
+        # counts: (name, recipe_count) pairs; unused ingredients are suggested but never corrected to
+        from spelling import IngredientSpeller
+        from suggestions import IngredientSuggester
+        counts = list(counts)
+        self.version = version
+        self.suggester = IngredientSuggester(counts)
+        self.speller = IngredientSpeller((name, count) for name, count in counts if count)
+
+    def __len__(self):
+        return len(self.suggester)
+
+
+class CatalogSnapshot:
+    """Read-only view of the recipe catalog at one catalog version"""
+
+    def __init__(self, version, recipes, vocabulary=(), resolver=None):
+        # vocabulary: ingredient names, e.g. every row of the ingredients table
+        self.version = version
+        self.recipes = recipes
+        self._payloads = {}
+        # The resolver is shared with older snapshots; it only ever grows
+        self.resolver = resolver if resolver is not None else IngredientResolver()
+        vocabulary_ids = self.resolver.extend(vocabulary)
+        # Recipe ingredients missing from the vocabulary are added in one batch
+        self.resolver.extend(name for name in sorted({
+            normalize_ingredient(ing) for recipe in recipes for ing in recipe.get('ingredients', [])
+        }) if name not in self.resolver.ids)
+        self.recipe_ingredient_ids = [
+            tuple(self.resolver.ids[normalize_ingredient(ing)] for ing in recipe.get('ingredients', []))
+            for recipe in recipes
+        ]
+        self.ingredient_index = build_ingredient_index(self.recipe_ingredient_ids)
+        # Built here, off the request path, and saved with the artifact
+        self.lexicon = IngredientLexicon(version, (
+            (self.resolver.names[ingredient_id], len(self.ingredient_index.get(ingredient_id, ())))
+            for ingredient_id in dict.fromkeys(vocabulary_ids + list(self.ingredient_index))))
+        
+        # Bit i of each bitmap is set when the recipe at position i qualifies
+        self.all_recipes_bitmap = (1 << len(recipes)) - 1
+        tag_positions = {}
+        type_positions = {}
+        for position, recipe in enumerate(recipes):
+            for tag in {tag.lower() for tag in recipe.get('tags', [])}:
+                tag_positions.setdefault(tag, []).append(position)
+            type_positions.setdefault(recipe.get('type', '').lower(), []).append(position)
+        self.tag_bitmaps = {tag: bitmap_from_positions(positions, len(recipes))
+                            for tag, positions in tag_positions.items()}
+        self.type_bitmaps = {recipe_type: bitmap_from_positions(positions, len(recipes))
+                             for recipe_type, positions in type_positions.items()}
+
+    def __len__(self):
+        return len(self.recipes)
+
+    def payload(self, position):
+        """Pre-encoded static fields of the recipe at a position, encoded on first use"""
+        payload = self._payloads.get(position)
+        if payload is None:
+            payload = self._payloads[position] = RecipePayload(self.recipes[position])
+        return payload
+
+    def encode_payloads(self):
+        """Encode every recipe payload up front, e.g. before saving the snapshot"""
+        for position in range(len(self.recipes)):
+            self.payload(position)
+
+    def pantry_ids(self, user_ingredients):
+        """Ids of every ingredient the pantry satisfies"""
+        pantry = set()
+        for ing in user_ingredients:
+            pantry.update(self.resolver.resolve(ing))
+        return pantry
+
+    def candidate_bitmap(self, pantry):
+        """Bitmap of recipes using at least one pantry ingredient id"""
+        return bitmap_from_positions(
+            (position for ingredient_id in pantry for position in self.ingredient_index.get(ingredient_id, ())),
+            len(self.recipes))
+
+    def tag_bitmap(self, tags):
+        """Bitmap of recipes carrying every one of the (lowercased) tags"""
+        bitmap = self.all_recipes_bitmap
+        for tag in tags:
+            bitmap &= self.tag_bitmaps.get(tag, 0)
+        return bitmap
+
+    def type_bitmap(self, recipe_type):
+        """Bitmap of recipes of one (lowercased) meal type"""
+        return self.type_bitmaps.get(recipe_type, 0)
+
+
+def build_ingredient_index(recipe_ingredient_ids):
+    """Map each ingredient id to the positions of the recipes that use it"""
+    index = {}
+    for position, ingredient_ids in enumerate(recipe_ingredient_ids):
+        for ingredient_id in ingredient_ids:
+            postings = index.setdefault(ingredient_id, [])
+            if not postings or postings[-1] != position:
+                postings.append(position)
+    return {ingredient_id: tuple(postings) for ingredient_id, postings in index.items()}
+
+
+def bitmap_from_positions(positions, size):
+    """Bitmap with the given positions set"""
+    bits = bytearray((size + 7) // 8)
+    for position in positions:
+        bits[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def iter_positions(bitmap):
+    """Positions of the set bits of a bitmap, in ascending order"""
+    bits = bin(bitmap)[:1:-1]
+    position = bits.find('1')
+    while position != -1:
+        yield position
+        position = bits.find('1', position + 1)
+
+
+# Bump when the snapshot layout changes so stale artifacts are rejected
+# 2: resolver ids are assigned by the resolver, not taken from the ingredients table
+# 3: snapshots carry their IngredientLexicon
+CATALOG_ARTIFACT_FORMAT = 3
+
+
+def save_snapshot(snapshot, path):
+    """Write a snapshot, with every payload encoded, to a catalog artifact file"""
+    snapshot.encode_payloads()
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, 'wb') as f:
+        pickle.dump({'format': CATALOG_ARTIFACT_FORMAT, 'snapshot': snapshot}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    # Workers never see a half-written artifact
+    os.replace(temporary_path, path)
+
+
+def load_snapshot(path):
+    """Read a snapshot written by save_snapshot()"""
+    with open(path, 'rb') as f:
+        artifact = pickle.load(f)
+    if artifact.get('format') != CATALOG_ARTIFACT_FORMAT:
+        raise ValueError(f"{path}: catalog artifact format {artifact.get('format')}, expected {CATALOG_ARTIFACT_FORMAT}")
+    return artifact['snapshot']
+
+
+class CatalogCache:
+    """Holds the current catalog snapshot (or other versioned catalog data) and swaps in a new one when the version moves"""
+
+    def __init__(self, read_version, build_snapshot, check_interval=5.0, name='catalog snapshot'):
+        # build_snapshot(previous) receives the snapshot being replaced, or None; snapshots have a version
+        self.name = name
+        self._read_version = read_version
+        self._build_snapshot = build_snapshot
+        self.check_interval = check_interval
+        self._snapshot = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self._rebuilding = False
+
+    def get(self):
+        """Return the current snapshot, scheduling a rebuild if the catalog changed"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            # Nothing to serve yet, so the first caller builds while the rest wait
+            with self._lock:
+                if self._snapshot is None:
+                    self._snapshot = self._build_snapshot(None)
+                    self._last_check = time.monotonic()
+                return self._snapshot
+
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return snapshot
+        self._last_check = now
+
+        try:
+            version = self._read_version()
+        except Exception as e:
+            logging.error(f"Error reading catalog version: {e}")
+            return snapshot
+
+        if version != snapshot.version:
+            self._start_rebuild()
+
+        # In-flight and concurrent searches keep using the old snapshot until the swap
+        return snapshot
+
+    def peek(self):
+        """The snapshot being served, or None; never checks the version or builds"""
+        return self._snapshot
+
+    def preload(self, snapshot):
+        """Serve a ready-made snapshot; its version is checked on the next get()"""
+        with self._lock:
+            self._snapshot = snapshot
+            self._last_check = 0.0
+
+    def invalidate(self):
+        """Force a version check on the next get()"""
+        self._last_check = 0.0
+
+    def _start_rebuild(self):
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(target=self._rebuild, name="catalog-rebuild", daemon=True).start()
+
+    def _rebuild(self):
+        try:
+            snapshot = self._build_snapshot(self._snapshot)
+            self._snapshot = snapshot
+            logging.info(f"Rebuilt {self.name} at version {snapshot.version} ({len(snapshot)} entries)")
+        except Exception as e:
+            logging.error(f"Error rebuilding {self.name}: {e}")
+            # Retry on the next request instead of waiting a full interval
+            self._last_check = 0.0
+        finally:
+            self._rebuilding = False
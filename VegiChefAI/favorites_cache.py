@@ -0,0 +1,50 @@
+"""
+Per-worker LRU of users' favorite recipe ids, checked against a token kept in the session
+"""
+import secrets
+import threading
+from collections import OrderedDict
+
+
+def new_favorites_token():
+    """Token naming one state of a user's favorites; the session carries it instead of the ids"""
+    return secrets.token_hex(4)
+
+
+class FavoriteIdsCache:
+    """Favorite recipe ids per user_id, valid while the session's token matches
+
+    Every write stores the ids under a fresh token and puts that token in the
+    session, so another worker holding older ids sees a different token and
+    reloads them from the database. The cookie stays the same size however many
+    favorites a user has.
+    """
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, user_id, token):
+        """Cached favorite ids of a user at a token, or None"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] != token:
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[1]
+
+    def put(self, user_id, token, favorite_ids):
+        """Remember a user's favorite ids under a token; returns them as a frozenset"""
+        favorite_ids = frozenset(favorite_ids)
+        if self.max_entries <= 0:
+            return favorite_ids
+        with self._lock:
+            self._entries[user_id] = (token, favorite_ids)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return favorite_ids
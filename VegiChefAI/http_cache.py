@@ -0,0 +1,56 @@
+"""
+HTTP helpers for validators and response compression
+"""
+import gzip
+import hashlib
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'application/javascript',
+    'text/javascript',
+    'text/html',
+    'text/css',
+    'text/plain',
+}
+
+
+def etag_for(*parts):
+    """Short validator derived from the given parts (catalog version, user state, body digest...)"""
+    return hashlib.sha1('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()[:20]
+
+
+def body_digest(data):
+    """Digest of a response body, for validators of responses that can't be derived up front"""
+    return hashlib.md5(data).hexdigest()
+
+
+def compress_response(response, accept_encodings, min_size=1024, level=6):
+    """Compress a buffered text response with brotli or gzip when the client accepts it"""
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code in (204, 206, 304)
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    # Caches must keep compressed and plain variants apart even when this one stays plain
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    if len(data) < min_size:
+        return response
+
+    encoding = accept_encodings.best_match(['br', 'gzip'] if brotli is not None else ['gzip'])
+    if encoding == 'br':
+        data = brotli.compress(data, quality=min(level, 11))
+    elif encoding == 'gzip':
+        data = gzip.compress(data, compresslevel=level, mtime=0)
+    else:
+        return response
+
+    response.set_data(data)
+    response.headers['Content-Encoding'] = encoding
+    return response
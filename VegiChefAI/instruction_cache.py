@@ -0,0 +1,139 @@
+"""
+Two-tier cache for AI cooking instructions: an in-process LRU in front of a database table
+"""
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+class ComputationAbandoned(Exception):
+    """The caller computing a value stopped before finishing it; waiters should compute it themselves"""
+
+
+class DatabaseInstructionStore:
+    """Persistent tier backed by the cached_instructions table"""
+
+    def get(self, key):
+        from models import CachedInstruction
+        entry = CachedInstruction.query.filter_by(cache_key=key).first()
+        return json.loads(entry.payload) if entry else None
+
+    def put(self, key, value, recipe_name=''):
+        from sqlalchemy.exc import IntegrityError
+        from app import db
+        from models import CachedInstruction
+        try:
+            db.session.add(CachedInstruction(cache_key=key, recipe_name=recipe_name, payload=json.dumps(value)))
+            db.session.commit()
+        except IntegrityError:
+            # Another worker stored the same prompt first
+            db.session.rollback()
+
+
+class InstructionCache:
+    """LRU with TTL in front of a persistent store, with single-flight loading per key"""
+
+    def __init__(self, store=None, max_entries=1024, ttl=3600):
+        self.store = store
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Cached value from the in-process tier, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        """Store a value in the in-process tier"""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def lookup(self, key):
+        """Cached value from either tier, or None; store hits are promoted to the in-process tier"""
+        value = self.get(key)
+        if value is None and self.store is not None:
+            try:
+                value = self.store.get(key)
+            except Exception as e:
+                logging.error(f"Error reading cached instructions: {e}")
+            if value is not None:
+                self.put(key, value)
+        return value
+
+    def remember(self, key, value, recipe_name=''):
+        """Store a successful result in both tiers"""
+        if self.store is not None:
+            try:
+                self.store.put(key, value, recipe_name=recipe_name)
+            except Exception as e:
+                logging.error(f"Error saving cached instructions: {e}")
+        self.put(key, value)
+
+    def claim(self, key):
+        """(future, leader) for key: the leader computes the value and settle()s the future,
+        other callers wait on future.result()"""
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                return future, False
+            future = self._in_flight[key] = Future()
+            return future, True
+
+    def settle(self, key, future, value=None, error=None):
+        """Hand a claimed key's value, or the error computing it, to every waiting caller"""
+        if error is None:
+            future.set_result(value)
+        else:
+            future.set_exception(error)
+        with self._lock:
+            self._in_flight.pop(key, None)
+
+    def get_or_compute(self, key, compute, recipe_name=''):
+        """Return the cached value for key, calling compute() at most once across concurrent callers
+
+        Exceptions from compute() propagate to every waiting caller and nothing is cached.
+        """
+        while True:
+            value = self.get(key)
+            if value is not None:
+                return value
+
+            future, leader = self.claim(key)
+            if leader:
+                break
+            try:
+                return future.result()
+            except ComputationAbandoned:
+                # The leader went away (a closed stream); the next caller takes over
+                continue
+
+        try:
+            value = self.lookup(key)
+            if value is None:
+                value = compute()
+                self.remember(key, value, recipe_name=recipe_name)
+        except BaseException as e:
+            self.settle(key, future, error=e)
+            raise
+        self.settle(key, future, value)
+        return value
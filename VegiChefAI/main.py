@@ -1 +1,5 @@
-from app import app  # noqa: F401
+from app import app, init_db, preload_catalog  # noqa: F401
+
+# Once per process; with gunicorn --preload that is once, before the workers fork
+init_db()
+preload_catalog()
@@ -0,0 +1,235 @@
+"""
+Per-worker request metrics, exposed in the Prometheus text format
+
+Every request records its latency, named phases (see request_phase()) and the SQL
+statements it issued; OpenAI calls record their latency and errors. Counts are kept
+per process, so each gunicorn worker reports its own.
+"""
+import time
+import threading
+from contextvars import ContextVar
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128)
+OPENAI_BUCKETS = (0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                     for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class Counter:
+    """Monotonic count per label set"""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            yield self.name + format_labels(self.labelnames, labels), value
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count per label set"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                # Per-bucket counts, made cumulative when rendered; the last slot is +Inf
+                series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            values = sorted((labels, (list(counts), total, count))
+                            for labels, (counts, total, count) in self._values.items())
+        names = self.labelnames + ('le',)
+        for labels, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                yield self.name + '_bucket' + format_labels(names, labels + (format_value(bound),)), cumulative
+            yield self.name + '_sum' + format_labels(self.labelnames, labels), total
+            yield self.name + '_count' + format_labels(self.labelnames, labels), count
+
+
+class Callback:
+    """Value read from the application when the metrics are scraped"""
+
+    def __init__(self, name, documentation, read, kind='gauge'):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self._read = read
+
+    def samples(self):
+        yield self.name, self._read()
+
+
+class MetricsRegistry:
+    """Metrics of this process, in registration order"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name, documentation, read, kind='gauge'):
+        return self.register(Callback(name, documentation, read, kind))
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(f"{name} {format_value(value)}" for name, value in metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+request_seconds = registry.histogram(
+    'vegichef_request_duration_seconds', 'Time spent handling requests', ('endpoint', 'method', 'status'))
+request_phase_seconds = registry.histogram(
+    'vegichef_request_phase_seconds', 'Time spent in named phases of a request', ('endpoint', 'phase'))
+request_sql_statements = registry.histogram(
+    'vegichef_request_sql_statements', 'SQL statements issued per request', ('endpoint',), STATEMENT_BUCKETS)
+request_sql_seconds = registry.histogram(
+    'vegichef_request_sql_seconds', 'Time spent in SQL statements per request', ('endpoint',))
+openai_seconds = registry.histogram(
+    'vegichef_openai_request_duration_seconds', 'OpenAI API call latency', ('operation',), OPENAI_BUCKETS)
+openai_errors = registry.counter(
+    'vegichef_openai_errors_total', 'Failed OpenAI API calls', ('operation', 'error'))
+
+
+class RequestMetrics:
+    """Timings and SQL statements of the request in progress"""
+
+    __slots__ = ('started', 'phases', 'sql_statements', 'sql_seconds')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.sql_statements = 0
+        self.sql_seconds = 0.0
+
+
+# Kept outside flask.g, which nested app contexts (catalog builds, version reads) replace
+_current = ContextVar('request_metrics', default=None)
+
+
+def current_request_metrics():
+    """Metrics of the request being handled, or None outside requests"""
+    return _current.get()
+
+
+def start_request(record=True):
+    """Begin collecting for the request on this thread; record=False leaves it out"""
+    _current.set(RequestMetrics() if record else None)
+
+
+def finish_request(endpoint, method, status):
+    """Record the request's metrics; returns its duration and RequestMetrics, or None if it was never started"""
+    request_metrics = _current.get()
+    if request_metrics is None:
+        return None
+    _current.set(None)
+    elapsed = time.perf_counter() - request_metrics.started
+    request_seconds.observe(elapsed, endpoint, method, str(status))
+    for phase, seconds in request_metrics.phases.items():
+        request_phase_seconds.observe(seconds, endpoint, phase)
+    request_sql_statements.observe(request_metrics.sql_statements, endpoint)
+    request_sql_seconds.observe(request_metrics.sql_seconds, endpoint)
+    return elapsed, request_metrics
+
+
+@contextmanager
+def request_phase(name):
+    """Time a block as a named phase of the current request; a no-op outside requests"""
+    request_metrics = current_request_metrics()
+    if request_metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        request_metrics.phases[name] = request_metrics.phases.get(name, 0.0) + time.perf_counter() - started
+
+
+@contextmanager
+def openai_call(operation):
+    """Time an OpenAI API call and count its failures"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        openai_errors.inc(operation, type(e).__name__)
+        raise
+    finally:
+        openai_seconds.observe(time.perf_counter() - started, operation)
+
+
+def instrument_engine(engine):
+    """Charge every SQL statement run on engine to the request that issued it"""
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info['statement_started'] = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop('statement_started', None)
+        request_metrics = current_request_metrics()
+        if started is not None and request_metrics is not None:
+            request_metrics.sql_statements += 1
+            request_metrics.sql_seconds += time.perf_counter() - started
@@ -1,97 +1,300 @@
 """
 Data migration script to populate the database with recipes from JSON file
+
+Recipes are streamed from a JSON array or a JSONL file and written with batched
+multi-row inserts, so large catalogs import with bounded memory. With --sync the
+existing catalog is updated in place: only recipes whose content hash changed are
+written, and users and favorites are left alone.
 """
 import json
-from app import app, db
-from models import Recipe, Ingredient, RecipeIngredient, RecipeStep, Tag, RecipeTag
+import time
+import hashlib
+import argparse
+from datetime import datetime
+from app import app, db, init_db
+from models import (Recipe, Ingredient, RecipeIngredient, RecipeStep, Tag, RecipeTag, CatalogVersion,
+                    CachedInstruction, get_catalog_version, bump_catalog_version)
+
+
+def iter_json_records(path, chunk_size=1 << 16):
+    """Yield the objects of a JSON array file, or of a JSONL file, without loading the whole file"""
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer = ''
+        position = 0
+        at_eof = False
+        in_array = None
+
+        while True:
+            # Skip whitespace and the array punctuation between records
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position < len(buffer) and in_array is None:
+                in_array = buffer[position] == '['
+                if in_array:
+                    position += 1
+                continue
+            if position < len(buffer) and buffer[position] == ']' and in_array:
+                return
+
+            if position < len(buffer):
+                try:
+                    record, end = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    # Most likely a record cut off by the chunk boundary
+                    if at_eof:
+                        raise
+                else:
+                    # A complete number could still continue in the next chunk; objects cannot
+                    if end < len(buffer) or at_eof or isinstance(record, dict):
+                        yield record
+                        position = end
+                        continue
+            elif at_eof:
+                if in_array:
+                    raise ValueError(f"{path}: unterminated JSON array")
+                return
+
+            chunk = f.read(chunk_size)
+            at_eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+
+
+def recipe_content_hash(recipe_data):
+    """SHA-256 of the fields a recipe is stored with, in their stored form"""
+    content = {
+        'name': recipe_data['name'],
+        'time': recipe_data['time'],
+        'type': recipe_data['type'],
+        'ingredients': [ingredient_name.lower().strip() for ingredient_name in recipe_data.get('ingredients', [])],
+        'steps': recipe_data.get('steps', []),
+        'tags': recipe_data.get('tags', []),
+    }
+    encoded = json.dumps(content, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+class BulkImporter:
+    """Writes recipes in batches, resolving ingredient and tag ids from in-memory dictionaries"""
+
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+        self.ingredient_ids = dict(db.session.query(Ingredient.name, Ingredient.id))
+        self.tag_ids = dict(db.session.query(Tag.name, Tag.id))
+        self.recipe_names = set()
+        self.recipe_count = 0
+        self._pending = []
+
+    def add(self, recipe_data, content_hash=None, recipe_id=None):
+        """Queue one recipe, writing a batch once enough are queued
+
+        With a recipe_id the existing recipe is rewritten in place, keeping its id
+        and therefore its favorites.
+        """
+        if recipe_data['name'] in self.recipe_names:
+            raise ValueError(f"Duplicate recipe name: {recipe_data['name']}")
+        self.recipe_names.add(recipe_data['name'])
+        self._pending.append((recipe_data, content_hash or recipe_content_hash(recipe_data), recipe_id))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Write and commit the queued recipes"""
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+        batch = [recipe_data for recipe_data, _, _ in pending]
+
+        ingredient_names = [[ingredient_name.lower().strip() for ingredient_name in recipe_data.get('ingredients', [])]
+                            for recipe_data in batch]
+        self._insert_missing(Ingredient, self.ingredient_ids,
+                             (name for names in ingredient_names for name in names))
+        self._insert_missing(Tag, self.tag_ids,
+                             (tag_name for recipe_data in batch for tag_name in recipe_data.get('tags', [])))
+
+        rows = [{'name': recipe_data['name'], 'time': recipe_data['time'], 'type': recipe_data['type'],
+                 'content_hash': content_hash} for recipe_data, content_hash, _ in pending]
+        new_rows = [row for row, (_, _, recipe_id) in zip(rows, pending) if recipe_id is None]
+        updates = [{'recipe_id': recipe_id, 'recipe_name': row['name'], 'recipe_time': row['time'],
+                    'recipe_type': row['type'], 'recipe_hash': row['content_hash'], 'recipe_updated_at': datetime.utcnow()}
+                   for row, (_, _, recipe_id) in zip(rows, pending) if recipe_id is not None]
+
+        # Recipe ids come back in parameter order, so they line up with the batch
+        new_ids = iter(db.session.scalars(
+            db.insert(Recipe).returning(Recipe.id, sort_by_parameter_order=True), new_rows).all()
+            if new_rows else ())
+        recipe_ids = [recipe_id if recipe_id is not None else next(new_ids) for _, _, recipe_id in pending]
+
+        if updates:
+            # Changed recipes keep their row and get their ingredients, steps and tags rewritten
+            recipes = Recipe.__table__
+            db.session.execute(
+                recipes.update().where(recipes.c.id == db.bindparam('recipe_id')).values(
+                    name=db.bindparam('recipe_name'), time=db.bindparam('recipe_time'),
+                    type=db.bindparam('recipe_type'), content_hash=db.bindparam('recipe_hash'),
+                    updated_at=db.bindparam('recipe_updated_at')),
+                updates)
+            delete_recipe_children([row['recipe_id'] for row in updates])
+
+        recipe_ingredients = []
+        steps = []
+        recipe_tags = []
+        for recipe_id, recipe_data, names in zip(recipe_ids, batch, ingredient_names):
+            # Repeated ingredients or tags would break the unique constraints; keep the first
+            for ingredient_id in dict.fromkeys(self.ingredient_ids[name] for name in names):
+                recipe_ingredients.append({'recipe_id': recipe_id, 'ingredient_id': ingredient_id})
+            for idx, step_description in enumerate(recipe_data.get('steps', [])):
+                steps.append({'recipe_id': recipe_id, 'step_number': idx + 1, 'description': step_description})
+            for tag_id in dict.fromkeys(self.tag_ids[tag_name] for tag_name in recipe_data.get('tags', [])):
+                recipe_tags.append({'recipe_id': recipe_id, 'tag_id': tag_id})
+
+        for model, rows in ((RecipeIngredient, recipe_ingredients), (RecipeStep, steps), (RecipeTag, recipe_tags)):
+            if rows:
+                db.session.execute(db.insert(model), rows)
+
+        db.session.commit()
+        self.recipe_count += len(batch)
+
+    def _insert_missing(self, model, ids, names):
+        new_names = [name for name in dict.fromkeys(names) if name not in ids]
+        if new_names:
+            rows = db.session.execute(
+                db.insert(model).returning(model.id, model.name, sort_by_parameter_order=True),
+                [{'name': name} for name in new_names])
+            ids.update((name, model_id) for model_id, name in rows)
+
+
+def delete_recipe_children(recipe_ids):
+    """Delete the ingredient, step and tag rows of the given recipes"""
+    for model in (RecipeIngredient, RecipeStep, RecipeTag):
+        db.session.execute(db.delete(model).where(model.recipe_id.in_(recipe_ids)))
 
 
-def migrate_json_to_database():
+def migrate_json_to_database(path='recipes.json', batch_size=1000):
     """Migrate recipes from JSON file to PostgreSQL database"""
-    
+
+    # The schema may not exist yet on a fresh database
+    init_db()
     with app.app_context():
-        # Clear existing data
-        db.drop_all()
+        # Keep the catalog version monotonic across the rebuild so workers notice it
+        previous_version = get_catalog_version()
+        db.session.rollback()
+
+        # Clear existing data; cached AI instructions are keyed by recipe name and outlive re-imports
+        kept_tables = {CachedInstruction.__table__}
+        db.metadata.drop_all(db.engine, tables=[table for table in db.metadata.sorted_tables
+                                                if table not in kept_tables])
         db.create_all()
-        
+
+        # Workers keep serving their current snapshot until the import is complete
+        db.session.add(CatalogVersion(id=1, version=previous_version))
+        db.session.commit()
+
         try:
-            # Load recipes from JSON file
-            with open('recipes.json', 'r', encoding='utf-8') as f:
-                recipes_data = json.load(f)
-            
-            print(f"Migrating {len(recipes_data)} recipes to database...")
-            
-            for recipe_data in recipes_data:
-                # Create recipe
-                recipe = Recipe(
-                    name=recipe_data['name'],
-                    time=recipe_data['time'],
-                    type=recipe_data['type']
-                )
-                db.session.add(recipe)
-                db.session.flush()  # Get the recipe ID
-                
-                # Add ingredients
-                for idx, ingredient_name in enumerate(recipe_data.get('ingredients', [])):
-                    # Get or create ingredient
-                    ingredient = Ingredient.query.filter_by(name=ingredient_name.lower().strip()).first()
-                    if not ingredient:
-                        ingredient = Ingredient(name=ingredient_name.lower().strip())
-                        db.session.add(ingredient)
-                        db.session.flush()
-                    
-                    # Create recipe-ingredient relationship
-                    recipe_ingredient = RecipeIngredient(
-                        recipe_id=recipe.id,
-                        ingredient_id=ingredient.id
-                    )
-                    db.session.add(recipe_ingredient)
-                
-                # Add steps
-                for idx, step_description in enumerate(recipe_data.get('steps', [])):
-                    step = RecipeStep(
-                        recipe_id=recipe.id,
-                        step_number=idx + 1,
-                        description=step_description
-                    )
-                    db.session.add(step)
-                
-                # Add tags
-                for tag_name in recipe_data.get('tags', []):
-                    # Get or create tag
-                    tag = Tag.query.filter_by(name=tag_name).first()
-                    if not tag:
-                        tag = Tag(name=tag_name)
-                        db.session.add(tag)
-                        db.session.flush()
-                    
-                    # Create recipe-tag relationship
-                    recipe_tag = RecipeTag(
-                        recipe_id=recipe.id,
-                        tag_id=tag.id
-                    )
-                    db.session.add(recipe_tag)
-                
-                print(f"Migrated: {recipe_data['name']}")
-            
-            # Commit all changes
+            print(f"Migrating recipes from {path} to database...")
+
+            importer = BulkImporter(batch_size=batch_size)
+            started = time.monotonic()
+            reported = 0
+            for recipe_data in iter_json_records(path):
+                importer.add(recipe_data)
+                if importer.recipe_count - reported >= 10 * batch_size:
+                    reported = importer.recipe_count
+                    elapsed = time.monotonic() - started
+                    print(f"Migrated {reported} recipes ({reported / elapsed:.0f} recipes/s)")
+            importer.flush()
+            elapsed = time.monotonic() - started
+
+            # Publish the new catalog
+            catalog_version = bump_catalog_version(previous_version)
             db.session.commit()
-            
+
             # Verify migration
             recipe_count = Recipe.query.count()
             ingredient_count = Ingredient.query.count()
             tag_count = Tag.query.count()
-            
+
             print(f"\nMigration completed successfully!")
-            print(f"- {recipe_count} recipes")
+            print(f"- {recipe_count} recipes in {elapsed:.1f}s ({recipe_count / max(elapsed, 1e-9):.0f} recipes/s)")
             print(f"- {ingredient_count} unique ingredients")
             print(f"- {tag_count} unique tags")
-            
+            print(f"- catalog version {catalog_version}")
+
         except Exception as e:
             db.session.rollback()
             print(f"Error during migration: {e}")
             raise
 
 
+def sync_json_to_database(path='recipes.json', batch_size=1000):
+    """Bring the database catalog in line with a JSON file, writing only recipes that changed"""
+
+    # Sync works on the existing schema, upgraded if needed
+    init_db()
+    with app.app_context():
+        stored = {name: (recipe_id, content_hash) for recipe_id, name, content_hash
+                  in db.session.query(Recipe.id, Recipe.name, Recipe.content_hash)}
+        importer = BulkImporter(batch_size=batch_size)
+        inserted = updated = unchanged = 0
+        started = time.monotonic()
+
+        try:
+            for recipe_data in iter_json_records(path):
+                content_hash = recipe_content_hash(recipe_data)
+                recipe_id, stored_hash = stored.pop(recipe_data['name'], (None, None))
+                if recipe_id is not None and stored_hash == content_hash:
+                    # Still counts as seen, so a duplicate later in the file is rejected
+                    importer.recipe_names.add(recipe_data['name'])
+                    unchanged += 1
+                    continue
+                importer.add(recipe_data, content_hash, recipe_id)
+                if recipe_id is None:
+                    inserted += 1
+                else:
+                    updated += 1
+            importer.flush()
+
+            # Whatever is left in the database is no longer in the file
+            from models import UserFavorite
+            removed_ids = sorted(recipe_id for recipe_id, _ in stored.values())
+            for offset in range(0, len(removed_ids), batch_size):
+                chunk = removed_ids[offset:offset + batch_size]
+                delete_recipe_children(chunk)
+                db.session.execute(db.delete(UserFavorite).where(UserFavorite.recipe_id.in_(chunk)))
+                db.session.execute(db.delete(Recipe).where(Recipe.id.in_(chunk)))
+
+            # Workers only rebuild their snapshot when something actually changed
+            if inserted or updated or removed_ids:
+                # Ingredients and tags no longer used by any recipe would linger in the picker
+                db.session.execute(db.delete(Ingredient).where(
+                    Ingredient.id.not_in(db.select(RecipeIngredient.ingredient_id))))
+                db.session.execute(db.delete(Tag).where(Tag.id.not_in(db.select(RecipeTag.tag_id))))
+                catalog_version = bump_catalog_version()
+            else:
+                catalog_version = get_catalog_version()
+            db.session.commit()
+
+            elapsed = time.monotonic() - started
+            print(f"Sync completed in {elapsed:.2f}s: {inserted} inserted, {updated} updated, "
+                  f"{len(removed_ids)} deleted, {unchanged} unchanged (catalog version {catalog_version})")
+            return inserted, updated, len(removed_ids), unchanged
+
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error during sync: {e}")
+            raise
+
+
 if __name__ == '__main__':
-    migrate_json_to_database()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('path', nargs='?', default='recipes.json', help='JSON array or JSONL file of recipes')
+    parser.add_argument('--batch-size', type=int, default=1000, help='recipes written per batch and commit')
+    parser.add_argument('--sync', action='store_true',
+                        help='update the existing catalog in place instead of rebuilding the database')
+    args = parser.parse_args()
+
+    if args.sync:
+        sync_json_to_database(args.path, batch_size=args.batch_size)
+    else:
+        migrate_json_to_database(args.path, batch_size=args.batch_size)
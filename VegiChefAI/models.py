@@ -1,5 +1,7 @@
 from app import db
 from datetime import datetime
+from sqlalchemy.orm import selectinload
+from sqlalchemy.schema import CreateIndex
 
 
 class Recipe(db.Model):
@@ -9,16 +11,25 @@ class Recipe(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False, unique=True)
     time = db.Column(db.String(50), nullable=False)
-    type = db.Column(db.String(50), nullable=False)  # Breakfast, Lunch, Dinner, Snacks
+    type = db.Column(db.String(50), nullable=False, index=True)  # Breakfast, Lunch, Dinner, Snacks
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    content_hash = db.Column(db.String(64))  # Set by migrate_data.py; lets --sync skip unchanged recipes
     
     # Relationships
-    ingredients = db.relationship('RecipeIngredient', back_populates='recipe', cascade='all, delete-orphan')
-    steps = db.relationship('RecipeStep', back_populates='recipe', cascade='all, delete-orphan')
-    tags = db.relationship('RecipeTag', back_populates='recipe', cascade='all, delete-orphan')
+    ingredients = db.relationship('RecipeIngredient', back_populates='recipe', cascade='all, delete-orphan',
+                                  order_by='RecipeIngredient.id')
+    steps = db.relationship('RecipeStep', back_populates='recipe', cascade='all, delete-orphan',
+                            order_by='RecipeStep.step_number')
+    tags = db.relationship('RecipeTag', back_populates='recipe', cascade='all, delete-orphan',
+                           order_by='RecipeTag.id')
     favorites = db.relationship('UserFavorite', back_populates='recipe', cascade='all, delete-orphan')
     
+    # Meal type filters compare case-insensitively
+    __table_args__ = (
+        db.Index('ix_recipes_type_lower', db.func.lower(type)),
+    )
+    
     def to_dict(self):
         """Convert recipe to dictionary format"""
         return {
@@ -58,8 +69,11 @@ class RecipeIngredient(db.Model):
     recipe = db.relationship('Recipe', back_populates='ingredients')
     ingredient = db.relationship('Ingredient', back_populates='recipe_ingredients')
     
-    # Ensure unique recipe-ingredient combinations
-    __table_args__ = (db.UniqueConstraint('recipe_id', 'ingredient_id'),)
+    # Ensure unique recipe-ingredient combinations; the reverse index serves ingredient lookups
+    __table_args__ = (
+        db.UniqueConstraint('recipe_id', 'ingredient_id'),
+        db.Index('ix_recipe_ingredients_ingredient_recipe', 'ingredient_id', 'recipe_id'),
+    )
 
 
 class RecipeStep(db.Model):
@@ -102,8 +116,11 @@ class RecipeTag(db.Model):
     recipe = db.relationship('Recipe', back_populates='tags')
     tag = db.relationship('Tag', back_populates='recipe_tags')
     
-    # Ensure unique recipe-tag combinations
-    __table_args__ = (db.UniqueConstraint('recipe_id', 'tag_id'),)
+    # Ensure unique recipe-tag combinations; the reverse index serves tag lookups
+    __table_args__ = (
+        db.UniqueConstraint('recipe_id', 'tag_id'),
+        db.Index('ix_recipe_tags_tag_recipe', 'tag_id', 'recipe_id'),
+    )
 
 
 class User(db.Model):
@@ -133,4 +150,146 @@ class UserFavorite(db.Model):
     recipe = db.relationship('Recipe', back_populates='favorites')
     
     # Ensure unique user-recipe favorite combinations
-    __table_args__ = (db.UniqueConstraint('user_id', 'recipe_id'),)
\ No newline at end of file
+    __table_args__ = (db.UniqueConstraint('user_id', 'recipe_id'),)
+
+class CatalogVersion(db.Model):
+    """Single-row counter bumped whenever the recipe catalog changes"""
+    __tablename__ = 'catalog_version'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class CachedInstruction(db.Model):
+    """Persistent cache of AI cooking instructions, keyed by recipe and missing ingredients"""
+    __tablename__ = 'cached_instructions'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    cache_key = db.Column(db.String(64), nullable=False, unique=True)
+    recipe_name = db.Column(db.String(200), nullable=False, default='')
+    payload = db.Column(db.Text, nullable=False)  # JSON returned by get_cooking_instructions
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+def recipe_loader_options():
+    """Eager-load options for everything Recipe.to_dict() touches"""
+    return (
+        selectinload(Recipe.ingredients).joinedload(RecipeIngredient.ingredient),
+        selectinload(Recipe.steps),
+        selectinload(Recipe.tags).joinedload(RecipeTag.tag),
+    )
+
+
+def load_recipe_dicts(recipe_ids=None):
+    """Load recipes in Recipe.to_dict() format with four queries, however many recipes there are"""
+    def restrict(query, column):
+        return query if recipe_ids is None else query.where(column.in_(recipe_ids))
+    
+    recipes = {}
+    rows = db.session.execute(restrict(
+        db.select(Recipe.id, Recipe.name, Recipe.time, Recipe.type, Recipe.created_at).order_by(Recipe.id),
+        Recipe.id))
+    for recipe_id, name, time, recipe_type, created_at in rows:
+        recipes[recipe_id] = {
+            'id': recipe_id,
+            'name': name,
+            'time': time,
+            'type': recipe_type,
+            'ingredients': [],
+            'steps': [],
+            'tags': [],
+            'created_at': created_at.isoformat() if created_at else None
+        }
+    
+    children = (
+        ('ingredients', db.select(RecipeIngredient.recipe_id, Ingredient.name).join(Ingredient)
+            .order_by(RecipeIngredient.recipe_id, RecipeIngredient.id), RecipeIngredient.recipe_id),
+        ('steps', db.select(RecipeStep.recipe_id, RecipeStep.description)
+            .order_by(RecipeStep.recipe_id, RecipeStep.step_number), RecipeStep.recipe_id),
+        ('tags', db.select(RecipeTag.recipe_id, Tag.name).join(Tag)
+            .order_by(RecipeTag.recipe_id, RecipeTag.id), RecipeTag.recipe_id),
+    )
+    # Each statement may see later commits than the first (READ COMMITTED); rows of recipes
+    # added since are skipped, and the catalog version bump triggers another build for them
+    for key, query, recipe_id_column in children:
+        for recipe_id, value in db.session.execute(restrict(query, recipe_id_column)):
+            recipe = recipes.get(recipe_id)
+            if recipe is not None:
+                recipe[key].append(value)
+    
+    return list(recipes.values())
+
+
+def add_missing_columns():
+    """Add nullable columns added to the models after their tables already existed"""
+    inspector = db.inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not column.nullable:
+                continue
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            with db.engine.begin() as connection:
+                connection.execute(db.text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+
+
+def create_missing_indexes():
+    """Create indexes added to the models after their tables already existed"""
+    # IF NOT EXISTS rather than checkfirst: inspectors don't report expression indexes
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                connection.execute(CreateIndex(index, if_not_exists=True))
+
+
+def get_catalog_version():
+    """Return the current catalog version (0 if the catalog was never written)"""
+    version = db.session.query(CatalogVersion.version).filter_by(id=1).scalar()
+    return version or 0
+
+
+def bump_catalog_version(minimum=0):
+    """Advance the catalog version inside the transaction that changes recipes"""
+    row = db.session.get(CatalogVersion, 1, with_for_update=True)
+    if row is None:
+        row = CatalogVersion(id=1, version=0)
+        db.session.add(row)
+    row.version = max(row.version or 0, minimum) + 1
+    return row.version
+
+
+def apply_favorite_changes(user_id, add_ids=(), remove_ids=()):
+    """Add and remove favorites by recipe id with one statement each; the caller commits
+    
+    Adds skip unknown recipes and favorites that already exist, so repeated or
+    concurrent requests are idempotent.
+    """
+    from sqlalchemy import literal
+    
+    if add_ids:
+        rows = db.select(literal(user_id), Recipe.id, literal(datetime.utcnow())).where(Recipe.id.in_(add_ids))
+        columns = ['user_id', 'recipe_id', 'created_at']
+        dialect = db.session.get_bind().dialect.name
+        if dialect in ('postgresql', 'sqlite'):
+            if dialect == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert
+            statement = insert(UserFavorite).from_select(columns, rows).on_conflict_do_nothing(
+                index_elements=['user_id', 'recipe_id'])
+        else:
+            # No ON CONFLICT: skip existing pairs in the SELECT instead
+            existing = db.select(UserFavorite.id).where(UserFavorite.user_id == user_id,
+                                                        UserFavorite.recipe_id == Recipe.id)
+            statement = db.insert(UserFavorite).from_select(columns, rows.where(~existing.exists()))
+        db.session.execute(statement)
+    
+    if remove_ids:
+        db.session.execute(db.delete(UserFavorite).where(UserFavorite.user_id == user_id,
+                                                         UserFavorite.recipe_id.in_(remove_ids)))
+    
+    return [recipe_id for (recipe_id,) in db.session.execute(
+        db.select(UserFavorite.recipe_id).where(UserFavorite.user_id == user_id).order_by(UserFavorite.recipe_id))]
@@ -1,83 +1,222 @@
 import os
 import json
+import hashlib
 import logging
 from openai import OpenAI
+from metrics import openai_call
 
 # the newest OpenAI model is "gpt-4o" which was released May 13, 2024.
 # do not change this unless explicitly requested by the user
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY", "your-api-key-here")
 client = OpenAI(api_key=OPENAI_API_KEY)
 
-def get_cooking_instructions(recipe_name, user_ingredients, recipe_ingredients):
+def missing_ingredients_for(user_ingredients, recipe_ingredients):
+    """Recipe ingredients the prompt lists as missing"""
+    return [ing for ing in recipe_ingredients if ing not in user_ingredients]
+
+
+def instruction_cache_key(recipe_name, missing_ingredients):
+    """Cache key for a prompt: the recipe name plus the normalized set of missing ingredients"""
+    normalized_missing = sorted({ing.lower().strip() for ing in missing_ingredients})
+    raw_key = json.dumps([recipe_name.strip().lower(), normalized_missing])
+    return hashlib.sha256(raw_key.encode('utf-8')).hexdigest()
+
+
+def fallback_instructions(message):
+    """Placeholder payload returned when instructions could not be generated"""
+    return {
+        "instructions": [message],
+        "substitutions": [],
+        "tips": [],
+        "cultural_context": "",
+        "serving_suggestions": []
+    }
+
+
+def build_messages(recipe_name, user_ingredients, recipe_ingredients):
+    """Chat messages asking GPT-4o for instructions"""
+    missing_ingredients = missing_ingredients_for(user_ingredients, recipe_ingredients)
+    
+    prompt = f"""
+    You are an experienced Indian mother who loves to cook and teach cooking. 
+    A person wants to cook "{recipe_name}" and has these ingredients: {', '.join(user_ingredients)}.
+    
+    The complete recipe requires: {', '.join(recipe_ingredients)}.
+    Missing ingredients: {', '.join(missing_ingredients) if missing_ingredients else 'None'}.
+    
+    Please provide:
+    1. Step-by-step cooking instructions in a warm, motherly tone (like an Indian mom would explain)
+    2. Practical substitution suggestions for missing ingredients
+    3. Helpful cooking tips and tricks
+    4. Cultural context or interesting facts about this dish
+    5. Serving suggestions
+    
+    Keep the language natural and conversational, as if you're teaching your child to cook.
+    Use Indian English style and include terms like "hing", "jeera", "haldi" naturally.
+    
+    Format your response as JSON with these keys:
+    - "instructions": array of step-by-step cooking instructions
+    - "substitutions": array of substitution suggestions for missing ingredients
+    - "tips": array of helpful cooking tips
+    - "cultural_context": string with interesting facts about the dish
+    - "serving_suggestions": array of serving suggestions
     """
-    Get detailed AI-powered cooking instructions for a recipe
+    
+    return [
+        {
+            "role": "system",
+            "content": "You are an expert Indian cook and loving mother who explains recipes in a warm, conversational manner. Always respond with valid JSON in the specified format."
+        },
+        {
+            "role": "user", 
+            "content": prompt
+        }
+    ]
+
+
+def request_cooking_instructions(recipe_name, user_ingredients, recipe_ingredients):
     """
-    try:
-        # Prepare the prompt for GPT-4o
-        missing_ingredients = [ing for ing in recipe_ingredients if ing not in user_ingredients]
-        
-        prompt = f"""
-        You are an experienced Indian mother who loves to cook and teach cooking. 
-        A person wants to cook "{recipe_name}" and has these ingredients: {', '.join(user_ingredients)}.
-        
-        The complete recipe requires: {', '.join(recipe_ingredients)}.
-        Missing ingredients: {', '.join(missing_ingredients) if missing_ingredients else 'None'}.
-        
-        Please provide:
-        1. Step-by-step cooking instructions in a warm, motherly tone (like an Indian mom would explain)
-        2. Practical substitution suggestions for missing ingredients
-        3. Helpful cooking tips and tricks
-        4. Cultural context or interesting facts about this dish
-        5. Serving suggestions
-        
-        Keep the language natural and conversational, as if you're teaching your child to cook.
-        Use Indian English style and include terms like "hing", "jeera", "haldi" naturally.
-        
-        Format your response as JSON with these keys:
-        - "instructions": array of step-by-step cooking instructions
-        - "substitutions": array of substitution suggestions for missing ingredients
-        - "tips": array of helpful cooking tips
-        - "cultural_context": string with interesting facts about the dish
-        - "serving_suggestions": array of serving suggestions
-        """
-        
+    Ask GPT-4o for cooking instructions; raises on API or JSON errors
+    """
+    with openai_call('chat'):
         response = client.chat.completions.create(
             model="gpt-4o",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are an expert Indian cook and loving mother who explains recipes in a warm, conversational manner. Always respond with valid JSON in the specified format."
-                },
-                {
-                    "role": "user", 
-                    "content": prompt
-                }
-            ],
+            messages=build_messages(recipe_name, user_ingredients, recipe_ingredients),
             response_format={"type": "json_object"},
             max_tokens=1500,
             temperature=0.7
         )
+    
+    # Parse the JSON response
+    return json.loads(response.choices[0].message.content or "{}")
+
+
+def get_cooking_instructions(recipe_name, user_ingredients, recipe_ingredients, cache=None):
+    """
+    Get detailed AI-powered cooking instructions for a recipe
+    """
+    try:
+        if cache is None:
+            return request_cooking_instructions(recipe_name, user_ingredients, recipe_ingredients)
         
-        # Parse the JSON response
-        ai_response = json.loads(response.choices[0].message.content or "{}")
-        
-        return ai_response
+        # Identical prompts share one upstream call; failures are never cached
+        key = instruction_cache_key(recipe_name, missing_ingredients_for(user_ingredients, recipe_ingredients))
+        return cache.get_or_compute(
+            key,
+            lambda: request_cooking_instructions(recipe_name, user_ingredients, recipe_ingredients),
+            recipe_name=recipe_name,
+        )
         
     except json.JSONDecodeError as e:
         logging.error(f"Failed to parse AI response as JSON: {e}")
-        return {
-            "instructions": ["Sorry, I couldn't get proper cooking instructions right now. Please try again."],
-            "substitutions": [],
-            "tips": [],
-            "cultural_context": "",
-            "serving_suggestions": []
-        }
+        return fallback_instructions("Sorry, I couldn't get proper cooking instructions right now. Please try again.")
     except Exception as e:
         logging.error(f"Error getting AI cooking instructions: {e}")
-        return {
-            "instructions": ["Sorry, I couldn't connect to get cooking instructions right now. Please try again later."],
-            "substitutions": [],
-            "tips": [],
-            "cultural_context": "",
-            "serving_suggestions": []
-        }
+        return fallback_instructions("Sorry, I couldn't connect to get cooking instructions right now. Please try again later.")
+
+
+def stream_cooking_instructions(recipe_name, user_ingredients, recipe_ingredients, stream_client=None):
+    """
+    Stream GPT-4o's JSON answer, yielding text fragments as they arrive
+    """
+    # Timed until the last chunk arrives (or the client goes away)
+    with openai_call('stream'):
+        stream = (stream_client or client).chat.completions.create(
+            model="gpt-4o",
+            messages=build_messages(recipe_name, user_ingredients, recipe_ingredients),
+            response_format={"type": "json_object"},
+            max_tokens=1500,
+            temperature=0.7,
+            stream=True
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+class InstructionStreamParser:
+    """
+    Picks completed pieces out of a streamed instructions JSON object
+
+    feed() returns events as soon as they are complete: {"section", "item"} for each
+    element of an array section and {"section", "value"} for other top-level values.
+    """
+
+    def __init__(self):
+        self.buffer = ''
+        self._pos = 0
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._starts = {}
+        self._key = None
+
+    def feed(self, text):
+        """Consume more text and return the events it completed"""
+        self.buffer += text
+        events = []
+        while self._pos < len(self.buffer):
+            index, char = self._pos, self.buffer[self._pos]
+            self._pos += 1
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    self._close(index + 1, events)
+            elif char == '"':
+                self._open(index, scalar=False)
+                self._in_string = True
+            elif char in '{[':
+                self._open(index, scalar=False)
+                self._stack.append(char)
+            elif char in '}]':
+                self._end_scalar(index, events)
+                if self._stack:
+                    self._stack.pop()
+                self._close(index + 1, events)
+            elif char == ',':
+                self._end_scalar(index, events)
+            elif char != ':' and not char.isspace():
+                self._open(index, scalar=True)
+        return events
+
+    def result(self):
+        """The complete instructions object; raises json.JSONDecodeError if it is malformed"""
+        return json.loads(self.buffer or "{}")
+
+    def _tracked(self, depth):
+        # Top-level keys and values, and elements of top-level arrays
+        return depth == 1 or (depth == 2 and self._stack[1] == '[')
+
+    def _open(self, index, scalar):
+        depth = len(self._stack)
+        if self._tracked(depth) and depth not in self._starts:
+            self._starts[depth] = (index, scalar)
+
+    def _close(self, end, events):
+        depth = len(self._stack)
+        start = self._starts.get(depth)
+        if start is not None and not start[1]:
+            del self._starts[depth]
+            self._emit(depth, self.buffer[start[0]:end], events)
+
+    def _end_scalar(self, index, events):
+        depth = len(self._stack)
+        start = self._starts.get(depth)
+        if start is not None and start[1]:
+            del self._starts[depth]
+            self._emit(depth, self.buffer[start[0]:index].strip(), events)
+
+    def _emit(self, depth, token, events):
+        value = json.loads(token)
+        if depth == 2:
+            events.append({"section": self._key, "item": value})
+        elif self._key is None:
+            self._key = value
+        else:
+            if not isinstance(value, list):
+                events.append({"section": self._key, "value": value})
+            self._key = None
@@ -0,0 +1,136 @@
+"""
+Batch job that pre-generates AI cooking instructions for common pantry shapes
+
+Results go into the cached_instructions table, which /get_ai_instructions checks
+before calling OpenAI. Re-running the job skips prompts that are already stored,
+so an interrupted run resumes where it stopped.
+"""
+import json
+import time
+import argparse
+import threading
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import openai_helper
+from app import app, db, init_db
+from instruction_cache import DatabaseInstructionStore
+from models import CachedInstruction, Recipe, load_recipe_dicts
+
+
+class RateLimiter:
+    """Token bucket shared by the worker threads"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_slot = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(self._next_slot, now) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+class StubClient:
+    """Offline stand-in for the OpenAI client returning canned instructions"""
+
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, **kwargs):
+        content = json.dumps({
+            "instructions": ["Stub instructions generated offline."],
+            "substitutions": [],
+            "tips": [],
+            "cultural_context": "",
+            "serving_suggestions": []
+        })
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def pantry_shapes(recipe, shapes):
+    """(user_ingredients, recipe_ingredients) pairs to pre-generate for one recipe"""
+    ingredients = recipe['ingredients']
+    if 'full' in shapes:
+        # Everything available: nothing missing
+        yield list(ingredients), ingredients
+    if 'missing-one' in shapes:
+        for missing in ingredients:
+            yield [ing for ing in ingredients if ing != missing], ingredients
+
+
+def pregenerate_instructions(shapes=('full',), workers=4, rate=2.0, batch_size=100, limit=None):
+    """Generate and store instructions for every recipe in the selected pantry shapes"""
+    store = DatabaseInstructionStore()
+    limiter = RateLimiter(rate)
+
+    def generate(job):
+        recipe_name, user_ingredients, recipe_ingredients, _ = job
+        limiter.acquire()
+        return openai_helper.request_cooking_instructions(recipe_name, user_ingredients, recipe_ingredients)
+
+    with app.app_context():
+        recipe_ids = [recipe_id for (recipe_id,) in db.session.query(Recipe.id).order_by(Recipe.id)]
+        if limit is not None:
+            recipe_ids = recipe_ids[:limit]
+
+        generated = skipped = failed = 0
+        started = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for offset in range(0, len(recipe_ids), batch_size):
+                recipes = load_recipe_dicts(recipe_ids[offset:offset + batch_size])
+
+                jobs = {}
+                for recipe in recipes:
+                    for user_ingredients, recipe_ingredients in pantry_shapes(recipe, shapes):
+                        key = openai_helper.instruction_cache_key(
+                            recipe['name'],
+                            openai_helper.missing_ingredients_for(user_ingredients, recipe_ingredients))
+                        jobs[key] = (recipe['name'], user_ingredients, recipe_ingredients, key)
+
+                # Resume: prompts already in the store are skipped
+                stored = {key for (key,) in db.session.query(CachedInstruction.cache_key)
+                          .filter(CachedInstruction.cache_key.in_(list(jobs)))}
+                skipped += len(stored)
+
+                futures = {executor.submit(generate, job): job for key, job in jobs.items() if key not in stored}
+                for future in as_completed(futures):
+                    recipe_name, _, _, key = futures[future]
+                    try:
+                        store.put(key, future.result(), recipe_name=recipe_name)
+                        generated += 1
+                    except Exception as e:
+                        failed += 1
+                        print(f"Failed: {recipe_name}: {e}")
+
+                elapsed = time.monotonic() - started
+                print(f"{min(offset + batch_size, len(recipe_ids))}/{len(recipe_ids)} recipes - "
+                      f"{generated} generated, {skipped} already stored, {failed} failed ({elapsed:.1f}s)")
+
+        print(f"\nPre-generation finished: {generated} generated, {skipped} skipped, {failed} failed")
+        return generated, skipped, failed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--shapes', nargs='+', default=['full'], choices=['full', 'missing-one'],
+                        help='pantry shapes to pre-generate')
+    parser.add_argument('--workers', type=int, default=4, help='concurrent OpenAI requests')
+    parser.add_argument('--rate', type=float, default=2.0, help='maximum OpenAI requests per second')
+    parser.add_argument('--batch-size', type=int, default=100, help='recipes loaded per batch')
+    parser.add_argument('--limit', type=int, help='only process the first N recipes')
+    parser.add_argument('--stub', action='store_true', help='use an offline stub instead of OpenAI')
+    args = parser.parse_args()
+
+    if args.stub:
+        openai_helper.client = StubClient()
+    
+    init_db()
+
+    pregenerate_instructions(shapes=args.shapes, workers=args.workers, rate=args.rate,
+                             batch_size=args.batch_size, limit=args.limit)
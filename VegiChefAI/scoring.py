@@ -0,0 +1,262 @@
+"""
+Recipe matching and ranking engines used by search_recipes
+"""
+import logging
+import threading
+import weakref
+from collections import namedtuple
+
+from catalog import iter_positions
+
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed for the "numpy" engine
+    np = None
+
+# Request filter flags and the recipe tag each one requires
+FILTER_TAGS = {
+    'no_onion_garlic': 'no onion/garlic',
+    'jain': 'jain',
+    'satvik': 'satvik',
+    'quick': 'quick',
+    'healthy': 'healthy',
+}
+
+# One ranked search result; position is the recipe's index in the snapshot (None without one)
+RecipeMatch = namedtuple('RecipeMatch', 'recipe match_percentage missing_ingredients position')
+
+# Minimum match percentage for a recipe to be suggested
+MATCH_THRESHOLD = 30
+
+# Number of suggestions returned per search
+TOP_N = 10
+
+
+def calculate_match_percentage(user_ingredients, recipe_ingredients):
+    """Calculate what percentage of recipe ingredients the user has"""
+    if not recipe_ingredients:
+        return 0
+    
+    user_ingredients_lower = [ing.lower().strip() for ing in user_ingredients]
+    recipe_ingredients_lower = [ing.lower().strip() for ing in recipe_ingredients]
+    
+    matches = sum(1 for recipe_ing in recipe_ingredients_lower 
+                  if any(user_ing in recipe_ing or recipe_ing in user_ing 
+                        for user_ing in user_ingredients_lower))
+    
+    return round((matches / len(recipe_ingredients_lower)) * 100)
+
+def get_missing_ingredients(user_ingredients, recipe_ingredients):
+    """Get list of missing ingredients"""
+    user_ingredients_lower = [ing.lower().strip() for ing in user_ingredients]
+    recipe_ingredients_lower = [ing.lower().strip() for ing in recipe_ingredients]
+    
+    missing = []
+    for recipe_ing in recipe_ingredients_lower:
+        if not any(user_ing in recipe_ing or recipe_ing in user_ing 
+                  for user_ing in user_ingredients_lower):
+            # Find the original case ingredient
+            original_ing = next(ing for ing in recipe_ingredients 
+                              if ing.lower().strip() == recipe_ing)
+            missing.append(original_ing)
+    
+    return missing
+
+def required_tags(filters):
+    """Lowercased tags a recipe must carry: the named flags plus any tags listed under "tags" """
+    tags = [tag for flag, tag in FILTER_TAGS.items() if filters.get(flag)]
+    extra_tags = filters.get('tags') or []
+    if isinstance(extra_tags, str):
+        extra_tags = [extra_tags]
+    tags.extend(tag.lower().strip() for tag in extra_tags)
+    return tags
+
+def matches_filters(recipe, filters, meal_type):
+    """Check one recipe against the dietary filters and meal type"""
+    # Check meal type filter
+    if meal_type and meal_type != "All" and recipe.get("type", "").lower() != meal_type.lower():
+        return False
+        
+    # Check dietary filters
+    recipe_tags = [tag.lower() for tag in recipe.get("tags", [])]
+    return all(tag in recipe_tags for tag in required_tags(filters))
+
+def filter_recipes(recipes, filters, meal_type):
+    """Filter recipes based on dietary preferences and meal type"""
+    return [recipe for recipe in recipes if matches_filters(recipe, filters, meal_type)]
+
+
+def filter_bitmap(snapshot, filters, meal_type):
+    """Bitmap of the snapshot recipes passing the dietary filters and meal type"""
+    bitmap = snapshot.tag_bitmap(required_tags(filters))
+    if meal_type and meal_type != "All":
+        bitmap &= snapshot.type_bitmap(meal_type.lower())
+    return bitmap
+
+
+def rank_many(engine, snapshot, searches, limit=TOP_N, threshold=MATCH_THRESHOLD):
+    """engine.rank() for each (user_ingredients, filters, meal_type), evaluating each distinct filter once"""
+    if not engine.uses_snapshot:
+        return [engine.rank(snapshot, user_ingredients, filters, meal_type, limit=limit, threshold=threshold)
+                for user_ingredients, filters, meal_type in searches]
+    
+    bitmaps = {}
+    results = []
+    for user_ingredients, filters, meal_type in searches:
+        key = (frozenset(required_tags(filters)), meal_type.lower() if meal_type and meal_type != "All" else None)
+        allowed = bitmaps.get(key)
+        if allowed is None:
+            allowed = bitmaps[key] = filter_bitmap(snapshot, filters, meal_type)
+        results.append(engine.rank(snapshot, user_ingredients, filters, meal_type, limit=limit,
+                                   threshold=threshold, allowed=allowed))
+    return results
+
+
+class PythonScoringEngine:
+    """Reference engine: scores candidate recipes one by one in Python"""
+    name = 'python'
+    uses_snapshot = True
+
+    def rank(self, snapshot, user_ingredients, filters, meal_type, limit=TOP_N, threshold=MATCH_THRESHOLD,
+             allowed=None):
+        """Return RecipeMatch tuples for the best matches, best first
+
+        allowed is the filter_bitmap() of filters and meal_type when the caller already has it.
+        """
+        pantry = snapshot.pantry_ids(user_ingredients)
+        if allowed is None:
+            allowed = filter_bitmap(snapshot, filters, meal_type)
+        
+        # Only recipes sharing an ingredient with the pantry can reach the match threshold
+        candidates = snapshot.candidate_bitmap(pantry) & allowed
+        
+        matches = []
+        for position in iter_positions(candidates):
+            recipe = snapshot.recipes[position]
+            # Integer set lookups stand in for the substring scans of calculate_match_percentage
+            ingredient_ids = snapshot.recipe_ingredient_ids[position]
+            matched = sum(1 for ingredient_id in ingredient_ids if ingredient_id in pantry)
+            match_percentage = round((matched / len(ingredient_ids)) * 100) if ingredient_ids else 0
+            if match_percentage >= threshold:
+                missing_ingredients = [ing for ing, ingredient_id in zip(recipe.get("ingredients", []), ingredient_ids)
+                                       if ingredient_id not in pantry]
+                matches.append(RecipeMatch(recipe, match_percentage, missing_ingredients, position))
+        
+        # Stable sort keeps catalog order between equal percentages
+        matches.sort(key=lambda match: match.match_percentage, reverse=True)
+        return matches[:limit]
+
+
+class IncidenceMatrix:
+    """Recipe x ingredient incidence matrix of a catalog snapshot in CSR form"""
+
+    def __init__(self, snapshot):
+        self.columns = {ingredient_id: column for column, ingredient_id in enumerate(snapshot.ingredient_index)}
+        
+        lengths = [len(ingredient_ids) for ingredient_ids in snapshot.recipe_ingredient_ids]
+        self.indptr = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=self.indptr[1:])
+        self.indices = np.fromiter(
+            (self.columns[ingredient_id]
+             for ingredient_ids in snapshot.recipe_ingredient_ids for ingredient_id in ingredient_ids),
+            dtype=np.int32, count=int(self.indptr[-1]))
+        self.rows = np.repeat(np.arange(len(lengths), dtype=np.int32), lengths)
+        self.lengths = np.asarray(lengths, dtype=np.float64)
+
+    def row_mask(self, bitmap):
+        """Boolean row mask from a snapshot bitmap"""
+        n_rows = len(self.lengths)
+        packed = np.frombuffer(bitmap.to_bytes((n_rows + 7) // 8, 'little'), dtype=np.uint8)
+        return np.unpackbits(packed, count=n_rows, bitorder='little').astype(bool)
+
+
+class NumpyScoringEngine:
+    """Vectorized engine: one sparse matrix-vector product per search"""
+    name = 'numpy'
+    uses_snapshot = True
+
+    def __init__(self):
+        self._matrices = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def prepare(self, snapshot):
+        """Build the snapshot's matrix ahead of the first search"""
+        self.matrix(snapshot)
+
+    def matrix(self, snapshot):
+        """Incidence matrix for a snapshot, built on first use"""
+        matrix = self._matrices.get(snapshot)
+        if matrix is None:
+            with self._lock:
+                matrix = self._matrices.get(snapshot)
+                if matrix is None:
+                    matrix = IncidenceMatrix(snapshot)
+                    self._matrices[snapshot] = matrix
+        return matrix
+
+    def rank(self, snapshot, user_ingredients, filters, meal_type, limit=TOP_N, threshold=MATCH_THRESHOLD,
+             allowed=None):
+        """Return RecipeMatch tuples for the best matches, best first
+
+        allowed is the filter_bitmap() of filters and meal_type when the caller already has it.
+        """
+        matrix = self.matrix(snapshot)
+        n_recipes = len(snapshot.recipes)
+        if n_recipes == 0:
+            return []
+        
+        # Pantry vector over the ingredient vocabulary
+        pantry = np.zeros(len(matrix.columns), dtype=np.float64)
+        columns = [matrix.columns[ingredient_id] for ingredient_id in snapshot.pantry_ids(user_ingredients)
+                   if ingredient_id in matrix.columns]
+        pantry[columns] = 1.0
+        
+        # Same floating point steps and half-even rounding as calculate_match_percentage
+        counts = np.bincount(matrix.rows, weights=pantry[matrix.indices], minlength=n_recipes)
+        percentages = np.zeros(n_recipes, dtype=np.int64)
+        has_ingredients = matrix.lengths > 0
+        percentages[has_ingredients] = np.round(counts[has_ingredients] / matrix.lengths[has_ingredients] * 100)
+        
+        eligible = percentages >= threshold
+        if allowed is None:
+            allowed = filter_bitmap(snapshot, filters, meal_type)
+        eligible &= matrix.row_mask(allowed)
+        
+        # Order by percentage descending, then catalog position, like the stable sort
+        rows = np.flatnonzero(eligible)
+        keys = (100 - percentages[rows]) * n_recipes + rows
+        if len(rows) > limit:
+            top = np.argpartition(keys, limit - 1)[:limit]
+            rows, keys = rows[top], keys[top]
+        rows = rows[np.argsort(keys)]
+        
+        results = []
+        for row in rows.tolist():
+            recipe = snapshot.recipes[row]
+            ingredients = recipe.get('ingredients', [])
+            row_columns = matrix.indices[matrix.indptr[row]:matrix.indptr[row + 1]]
+            missing = [ingredients[j] for j, column in enumerate(row_columns.tolist()) if not pantry[column]]
+            results.append(RecipeMatch(recipe, int(percentages[row]), missing, row))
+        return results
+
+
+ENGINES = {
+    'python': PythonScoringEngine,
+    'numpy': NumpyScoringEngine,
+}
+
+
+def get_scoring_engine(name):
+    """Create the configured scoring engine, falling back to the Python one"""
+    if (name or '').lower() == 'sql':
+        # Imported lazily: the SQL engine needs the database models
+        from sql_search import SqlScoringEngine
+        return SqlScoringEngine()
+    engine_class = ENGINES.get((name or 'python').lower())
+    if engine_class is None:
+        logging.warning(f"Unknown search engine '{name}', using the python engine")
+        engine_class = PythonScoringEngine
+    if engine_class is NumpyScoringEngine and np is None:
+        logging.warning("numpy is not installed, using the python search engine")
+        engine_class = PythonScoringEngine
+    return engine_class()
@@ -0,0 +1,72 @@
+"""
+LRU cache of ranked search results keyed by catalog version and the canonical request
+"""
+import threading
+from collections import OrderedDict
+
+from catalog import normalize_ingredient
+from scoring import required_tags
+
+
+def canonical_search(user_ingredients, filters, meal_type):
+    """Hashable form of a search; requests the engines treat alike share one form
+
+    Ingredient order, case, surrounding whitespace and repeats don't change a
+    ranking, and neither do the order or repeats of the required tags.
+    """
+    ingredients = tuple(sorted({normalize_ingredient(ing) for ing in user_ingredients}))
+    tags = tuple(sorted(set(required_tags(filters))))
+    recipe_type = meal_type.lower() if meal_type and meal_type != "All" else None
+    return ingredients, tags, recipe_type
+
+
+class SearchResultCache:
+    """Ranked matches per canonical search for the current catalog version"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, version, search):
+        """Cached matches for a canonical search at a catalog version, or None"""
+        with self._lock:
+            matches = self._entries.get(search) if version == self._version else None
+            if matches is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(search)
+            self.hits += 1
+            return matches
+
+    def put(self, version, search, matches):
+        """Remember the matches of a canonical search; a new catalog version drops older entries"""
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            if version != self._version:
+                self.evictions += len(self._entries)
+                self._entries.clear()
+                self._version = version
+            self._entries[search] = matches
+            self._entries.move_to_end(search)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        """Counters for monitoring"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
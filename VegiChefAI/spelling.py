@@ -0,0 +1,155 @@
+"""
+Typo correction for free-text ingredients over a character trigram index
+"""
+from bisect import bisect_left
+
+from catalog import normalize_ingredient, substrings
+
+# Shorter terms are too ambiguous to correct ("dal" is one edit from "oil")
+MIN_TERM_LENGTH = 4
+
+
+def trigrams(text):
+    """Distinct character trigrams of text"""
+    return {text[start:start + 3] for start in range(len(text) - 2)}
+
+
+def padded_trigrams(text):
+    """Trigrams of text padded with two spaces each side, so word edges count too"""
+    return trigrams(f"  {text}  ")
+
+
+def max_edits(term):
+    """Edits allowed when correcting a term: one, or two for terms of eight characters or more"""
+    return 1 if len(term) < 8 else 2
+
+
+def edit_distance(a, b, limit):
+    """Edit distance counting an adjacent swap as one edit, or limit + 1 once it exceeds limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    before_previous = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            distance = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                distance = min(distance, before_previous[j - 2] + 1)
+            current[j] = distance
+        if min(current) > limit:
+            return limit + 1
+        before_previous, previous = previous, current
+    return min(previous[-1], limit + 1)
+
+
+class IngredientSpeller:
+    """Closest known ingredient for terms no ingredient name contains, ranked by recipe count on ties
+
+    A name within k edits of a term shares all but 3k of the term's trigrams and is at
+    most k characters longer or shorter. Names are numbered by length, so each posting
+    list is cut to that length window with bisect before shared trigrams are counted,
+    and only names sharing enough of them get an edit distance check.
+    """
+
+    def __init__(self, counts):
+        # counts: (name, recipe_count) pairs
+        self.counts = {}
+        for name, count in counts:
+            name = normalize_ingredient(name)
+            self.counts[name] = self.counts.get(name, 0) + count
+        self._names = sorted(self.counts, key=lambda name: (len(name), name))
+        self._longest = len(self._names[-1]) if self._names else 0
+        # _length_starts[n] is the index of the first name at least n characters long
+        self._length_starts = [bisect_left(self._names, length, key=len)
+                               for length in range(len(self._names[-1]) + 2 if self._names else 1)]
+        postings = {}
+        for index, name in enumerate(self._names):
+            for gram in padded_trigrams(name):
+                postings.setdefault(gram, []).append(index)
+        self._postings = {gram: tuple(indexes) for gram, indexes in postings.items()}
+
+    def __len__(self):
+        return len(self.counts)
+
+    def _rarest_first(self, grams):
+        return sorted(grams, key=lambda gram: len(self._postings.get(gram, ())))
+
+    def contains_name(self, term):
+        """Whether the term contains some ingredient name ("cumin sedes" holds "cumin")"""
+        term = normalize_ingredient(term)
+        return any(sub in self.counts for sub in substrings(term, self._longest))
+
+    def in_name(self, term):
+        """Whether some ingredient name contains the term"""
+        term = normalize_ingredient(term)
+        if term in self.counts:
+            return True
+        if len(term) < 3:
+            return any(term in name for name in self._names)
+        # Names containing the term hold every one of its trigrams
+        candidates = None
+        for gram in self._rarest_first(trigrams(term)):
+            postings = self._postings.get(gram, ())
+            candidates = set(postings) if candidates is None else candidates.intersection(postings)
+            if not candidates:
+                return False
+        return any(term in self._names[index] for index in candidates)
+
+    def correct(self, term):
+        """Known ingredient closest to an unmatched term, or None when nothing is close enough"""
+        term = normalize_ingredient(term)
+        if len(term) < MIN_TERM_LENGTH or term in self.counts:
+            return None
+        limit = max_edits(term)
+        grams = padded_trigrams(term)
+        needed = max(1, len(grams) - 3 * limit)
+        starts = self._length_starts
+        low = starts[min(max(len(term) - limit, 0), len(starts) - 1)]
+        high = starts[min(len(term) + limit + 1, len(starts) - 1)]
+
+        # Trigrams shared with each name of a suitable length
+        shared = {}
+        for gram in grams:
+            postings = self._postings.get(gram, ())
+            for index in postings[bisect_left(postings, low):bisect_left(postings, high)]:
+                shared[index] = shared.get(index, 0) + 1
+
+        best = None
+        for index, count in shared.items():
+            if count < needed:
+                continue
+            name = self._names[index]
+            distance = edit_distance(term, name, limit)
+            if distance <= limit:
+                rank = (distance, -self.counts[name], name)
+                if best is None or rank < best:
+                    best = rank
+        return best[2] if best is not None else None
+
+    def correct_terms(self, terms):
+        """Terms with misspelt ones corrected, and (term, correction, replaced) for each correction
+
+        A term no ingredient name contains is corrected when a close name exists that the
+        term doesn't already hold ("tomatoes" matches "tomato" as it is). The term is
+        replaced, unless it holds shorter names itself: then the correction is added and
+        the term kept (replaced is False), so the ingredients it already matched still count.
+        """
+        corrected = []
+        corrections = []
+        for term in terms:
+            correction = None
+            normalized = normalize_ingredient(term)
+            if len(normalized) >= MIN_TERM_LENGTH and not self.in_name(normalized):
+                correction = self.correct(normalized)
+            if correction is not None and correction in normalized:
+                correction = None
+            if correction is None:
+                corrected.append(term)
+                continue
+            replaced = not self.contains_name(normalized)
+            if not replaced:
+                corrected.append(term)
+            corrected.append(correction)
+            corrections.append((term, correction, replaced))
+        return corrected, corrections
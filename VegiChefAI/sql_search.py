@@ -0,0 +1,127 @@
+"""
+Search mode that ranks recipes inside the database instead of in worker memory
+"""
+from sqlalchemy import Float, Integer, case, cast, func, literal, or_, select
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
+from scoring import MATCH_THRESHOLD, TOP_N, RecipeMatch, required_tags
+
+
+class floor_int(FunctionElement):
+    """Largest integer not above a non-negative float, portable across SQLite and PostgreSQL"""
+    type = Integer()
+    inherit_cache = True
+
+
+@compiles(floor_int)
+def _compile_floor_int(element, compiler, **kw):
+    return f"CAST(FLOOR({compiler.process(element.clauses, **kw)}) AS INTEGER)"
+
+
+@compiles(floor_int, 'sqlite')
+def _compile_floor_int_sqlite(element, compiler, **kw):
+    # SQLite may be built without math functions; truncation is floor for x >= 0
+    return f"CAST({compiler.process(element.clauses, **kw)} AS INTEGER)"
+
+
+class position_in(FunctionElement):
+    """1-based position of the second argument in the first, 0 when absent"""
+    type = Integer()
+    inherit_cache = True
+
+
+@compiles(position_in)
+def _compile_position_in(element, compiler, **kw):
+    return f"STRPOS({compiler.process(element.clauses, **kw)})"
+
+
+@compiles(position_in, 'sqlite')
+def _compile_position_in_sqlite(element, compiler, **kw):
+    return f"INSTR({compiler.process(element.clauses, **kw)})"
+
+
+def round_half_even(value):
+    """SQL expression rounding a non-negative float like Python's round()"""
+    whole = floor_int(value)
+    fraction = value - whole
+    return whole + case(
+        (fraction > 0.5, 1),
+        ((fraction == 0.5) & (whole % 2 == 1), 1),
+        else_=0,
+    )
+
+
+def pantry_ingredient_ids(user_ingredients):
+    """Ids of the ingredients the pantry satisfies, resolved with the bidirectional substring rule"""
+    from app import db
+    from models import Ingredient
+    
+    conditions = []
+    for ing in {ing.lower().strip() for ing in user_ingredients}:
+        # Ingredient names containing the term, or contained in it; one parameter however long the term
+        conditions.append(Ingredient.name.contains(ing, autoescape=True))
+        conditions.append(position_in(literal(ing), Ingredient.name) > 0)
+    if not conditions:
+        return set()
+    return set(db.session.scalars(select(Ingredient.id).where(or_(*conditions))))
+
+
+class SqlScoringEngine:
+    """Computes match counts, filters and the threshold in SQL and hydrates only the top recipes"""
+    name = 'sql'
+    uses_snapshot = False
+
+    def rank(self, snapshot, user_ingredients, filters, meal_type, limit=TOP_N, threshold=MATCH_THRESHOLD):
+        """Return RecipeMatch tuples for the best matches, best first"""
+        from app import db
+        from models import Recipe, RecipeIngredient, RecipeTag, Tag, recipe_loader_options
+        
+        pantry = pantry_ingredient_ids(user_ingredients)
+        if not pantry:
+            return []
+        
+        in_pantry = RecipeIngredient.ingredient_id.in_(pantry)
+        candidates = select(RecipeIngredient.recipe_id).where(in_pantry)
+        counts = (
+            select(
+                RecipeIngredient.recipe_id.label('recipe_id'),
+                func.count().label('total'),
+                func.sum(case((in_pantry, 1), else_=0)).label('matched'),
+            )
+            .where(RecipeIngredient.recipe_id.in_(candidates))
+            .group_by(RecipeIngredient.recipe_id)
+            .subquery()
+        )
+        # Same float steps as calculate_match_percentage: (matched / total) * 100
+        match_percentage = round_half_even(
+            cast(counts.c.matched, Float) / cast(counts.c.total, Float) * 100
+        ).label('match_percentage')
+        
+        query = (
+            select(counts.c.recipe_id, match_percentage)
+            .join(Recipe, Recipe.id == counts.c.recipe_id)
+            .where(match_percentage >= threshold)
+        )
+        if meal_type and meal_type != "All":
+            query = query.where(func.lower(Recipe.type) == meal_type.lower())
+        for tag in required_tags(filters):
+            tag_ids = select(Tag.id).where(func.lower(Tag.name) == tag)
+            query = query.where(Recipe.id.in_(
+                select(RecipeTag.recipe_id).where(RecipeTag.tag_id.in_(tag_ids))))
+        query = query.order_by(match_percentage.desc(), counts.c.recipe_id).limit(limit)
+        
+        ranked = db.session.execute(query).all()
+        if not ranked:
+            return []
+        
+        # Hydrate only the recipes that made the cut
+        recipes = {recipe.id: recipe for recipe in
+                   Recipe.query.options(*recipe_loader_options())
+                   .filter(Recipe.id.in_([recipe_id for recipe_id, _ in ranked]))}
+        results = []
+        for recipe_id, percentage in ranked:
+            recipe = recipes[recipe_id]
+            missing = [ri.ingredient.name for ri in recipe.ingredients if ri.ingredient_id not in pantry]
+            results.append(RecipeMatch(recipe.to_dict(), int(percentage), missing, None))
+        return results
@@ -2,33 +2,110 @@
 let selectedIngredients = new Set();
 let currentRecipes = [];
 let showingFavorites = false;
+let favoriteIds = new Set();
+let suggestTimer = null;
+
+// Number of most-used ingredients shown as checkboxes
+const POPULAR_INGREDIENT_COUNT = 24;
 
 // Initialize the app
 document.addEventListener('DOMContentLoaded', function() {
     loadFavorites();
     setupEventListeners();
     updateSelectedIngredientsDisplay();
+    loadPopularIngredients();
 });
 
 function setupEventListeners() {
-    // Ingredient checkbox listeners
-    document.querySelectorAll('.ingredient-checkbox').forEach(checkbox => {
-        checkbox.addEventListener('change', function() {
-            if (this.checked) {
-                selectedIngredients.add(this.value);
-            } else {
-                selectedIngredients.delete(this.value);
-            }
-            updateSelectedIngredientsDisplay();
-        });
+    // Ingredient checkbox listener; the checkboxes are loaded after the page
+    document.getElementById('ingredient-grid').addEventListener('change', function(e) {
+        const checkbox = e.target;
+        if (!checkbox.classList.contains('ingredient-checkbox')) return;
+        if (checkbox.checked) {
+            selectedIngredients.add(checkbox.value);
+        } else {
+            selectedIngredients.delete(checkbox.value);
+        }
+        updateSelectedIngredientsDisplay();
     });
 
-    // Manual ingredient input listener
-    document.getElementById('manual-ingredient').addEventListener('keypress', function(e) {
+    // Manual ingredient input listeners
+    const manualInput = document.getElementById('manual-ingredient');
+    manualInput.addEventListener('keypress', function(e) {
         if (e.key === 'Enter') {
             addManualIngredient();
         }
     });
+    manualInput.addEventListener('input', function() {
+        // Wait for a pause in typing before asking for suggestions
+        clearTimeout(suggestTimer);
+        const query = this.value.trim();
+        suggestTimer = setTimeout(() => updateIngredientSuggestions(query), 150);
+    });
+}
+
+function fetchIngredientSuggestions(query, limit) {
+    const params = new URLSearchParams({q: query, limit: limit});
+    return fetch(`/ingredients/suggest?${params}`)
+        .then(response => response.json())
+        .then(data => {
+            if (data.error) {
+                throw new Error(data.error);
+            }
+            return data.suggestions || [];
+        });
+}
+
+function loadPopularIngredients() {
+    const grid = document.getElementById('ingredient-grid');
+    
+    fetchIngredientSuggestions('', POPULAR_INGREDIENT_COUNT)
+    .then(suggestions => {
+        // Names come from the database, so they are set as text and values rather than markup
+        grid.replaceChildren(...suggestions.map(suggestion => {
+            const label = document.createElement('label');
+            label.className = 'flex items-center space-x-2 p-3 border border-gray-200 rounded-lg hover:bg-saffron-50 hover:border-saffron-300 cursor-pointer transition duration-200';
+            
+            const checkbox = document.createElement('input');
+            checkbox.type = 'checkbox';
+            checkbox.value = suggestion.name;
+            checkbox.className = 'ingredient-checkbox text-saffron-500 focus:ring-saffron-500 rounded';
+            checkbox.checked = selectedIngredients.has(suggestion.name);
+            
+            const name = document.createElement('span');
+            name.className = 'text-sm text-gray-700 capitalize';
+            name.textContent = suggestion.name;
+            
+            label.append(checkbox, name);
+            return label;
+        }));
+    })
+    .catch(error => {
+        console.error('Error loading ingredients:', error);
+        grid.innerHTML = '<div class="col-span-full text-center py-4 text-gray-400 text-sm">Type an ingredient above to add it.</div>';
+    });
+}
+
+function updateIngredientSuggestions(query) {
+    const datalist = document.getElementById('ingredient-suggestions');
+    if (!query) {
+        datalist.replaceChildren();
+        return;
+    }
+    
+    fetchIngredientSuggestions(query, 10)
+    .then(suggestions => {
+        // Ignore answers for text the user has already changed
+        if (document.getElementById('manual-ingredient').value.trim() !== query) return;
+        datalist.replaceChildren(...suggestions.map(suggestion => {
+            const option = document.createElement('option');
+            option.value = suggestion.name;
+            return option;
+        }));
+    })
+    .catch(error => {
+        console.error('Error loading ingredient suggestions:', error);
+    });
 }
 
 function addManualIngredient() {
@@ -38,6 +115,13 @@ function addManualIngredient() {
     if (ingredient && !selectedIngredients.has(ingredient)) {
         selectedIngredients.add(ingredient);
         input.value = '';
+        document.getElementById('ingredient-suggestions').replaceChildren();
+        
+        // Keep the matching checkbox in step if the ingredient is in the grid
+        const checkbox = document.querySelector(`.ingredient-checkbox[value="${CSS.escape(ingredient)}"]`);
+        if (checkbox) {
+            checkbox.checked = true;
+        }
         updateSelectedIngredientsDisplay();
     }
 }
@@ -50,23 +134,32 @@ function updateSelectedIngredientsDisplay() {
         return;
     }
     
-    const tags = Array.from(selectedIngredients).map(ingredient => 
-        `<span class="inline-flex items-center px-3 py-1 rounded-full text-sm bg-saffron-100 text-saffron-800 border border-saffron-200">
-            <span class="capitalize">${ingredient}</span>
-            <button onclick="removeIngredient('${ingredient}')" class="ml-2 text-saffron-600 hover:text-saffron-800">
-                <i class="fas fa-times text-xs"></i>
-            </button>
-        </span>`
-    ).join('');
+    // Typed ingredients can hold quotes or markup, so the tags are built as elements
+    const tags = Array.from(selectedIngredients).map(ingredient => {
+        const tag = document.createElement('span');
+        tag.className = 'inline-flex items-center px-3 py-1 rounded-full text-sm bg-saffron-100 text-saffron-800 border border-saffron-200';
+        
+        const name = document.createElement('span');
+        name.className = 'capitalize';
+        name.textContent = ingredient;
+        
+        const button = document.createElement('button');
+        button.className = 'ml-2 text-saffron-600 hover:text-saffron-800';
+        button.innerHTML = '<i class="fas fa-times text-xs"></i>';
+        button.addEventListener('click', () => removeIngredient(ingredient));
+        
+        tag.append(name, button);
+        return tag;
+    });
     
-    container.innerHTML = tags;
+    container.replaceChildren(...tags);
 }
 
 function removeIngredient(ingredient) {
     selectedIngredients.delete(ingredient);
     
     // Also uncheck the corresponding checkbox if it exists
-    const checkbox = document.querySelector(`.ingredient-checkbox[value="${ingredient}"]`);
+    const checkbox = document.querySelector(`.ingredient-checkbox[value="${CSS.escape(ingredient)}"]`);
     if (checkbox) {
         checkbox.checked = false;
     }
@@ -122,12 +215,11 @@ function searchRecipes() {
             return;
         }
 
+        // Favorite status arrives with each recipe as is_favorite
         currentRecipes = data.recipes || [];
+        rememberFavoriteStatus(currentRecipes);
         displayRecipes(currentRecipes, data.message);
-        
-        // Check favorite status for displayed recipes
-        const recipeNames = currentRecipes.map(recipe => recipe.name);
-        setTimeout(() => checkFavoriteStatus(recipeNames), 100);
+        applyCorrections(data.corrections || []);
     })
     .catch(error => {
         document.getElementById('loading').classList.add('hidden');
@@ -136,6 +228,36 @@ function searchRecipes() {
     });
 }
 
+// Swap misspelt ingredients the server corrected for the names it searched with
+function applyCorrections(corrections) {
+    if (corrections.length === 0) {
+        return;
+    }
+
+    corrections.forEach(correction => {
+        // Terms the server kept next to their correction stay selected, so the next search matches
+        if (correction.replaced) {
+            selectedIngredients.delete(correction.term);
+        }
+        selectedIngredients.add(correction.ingredient);
+        const checkbox = document.querySelector(`.ingredient-checkbox[value="${CSS.escape(correction.ingredient)}"]`);
+        if (checkbox) {
+            checkbox.checked = true;
+        }
+    });
+    updateSelectedIngredientsDisplay();
+
+    // Built with textContent: the terms are whatever the user typed
+    const note = document.createElement('div');
+    note.className = 'bg-yellow-50 border border-yellow-300 text-yellow-800 px-4 py-2 rounded mt-2 text-sm';
+    note.textContent = 'Searched for ' + corrections
+        .map(correction => correction.replaced
+            ? `"${correction.ingredient}" instead of "${correction.term}"`
+            : `"${correction.ingredient}" as well as "${correction.term}"`)
+        .join(', ') + '.';
+    document.getElementById('results-message').appendChild(note);
+}
+
 function displayRecipes(recipes, message) {
     const resultsSection = document.getElementById('results-section');
     const messageDiv = document.getElementById('results-message');
@@ -165,15 +287,15 @@ function displayRecipes(recipes, message) {
 }
 
 function createRecipeCard(recipe) {
-    const isFavorite = isRecipeFavorite(recipe.name);
+    const isFavorite = isRecipeFavorite(recipe);
     const heartIcon = isFavorite ? 'fas fa-heart text-pink-500' : 'far fa-heart text-gray-400';
     
     return `
-        <div class="bg-white rounded-xl shadow-lg overflow-hidden hover:shadow-xl transition duration-300">
+        <div class="bg-white rounded-xl shadow-lg overflow-hidden hover:shadow-xl transition duration-300" data-recipe-id="${recipe.id}">
             <div class="p-6">
                 <div class="flex justify-between items-start mb-3">
                     <h3 class="text-lg font-semibold text-gray-800">${recipe.name}</h3>
-                    <button onclick="toggleFavorite('${recipe.name}')" class="hover:scale-110 transition duration-200">
+                    <button onclick="toggleFavorite(${recipe.id}, '${recipe.name}')" class="hover:scale-110 transition duration-200">
                         <i class="${heartIcon} text-xl"></i>
                     </button>
                 </div>
@@ -244,16 +366,95 @@ function getAICookingInstructions(recipeName, userIngredients, recipeIngredients
         </div>
     `;
 
+    const payload = {
+        recipe_name: recipeName,
+        user_ingredients: userIngredients,
+        recipe_ingredients: recipeIngredients
+    };
+
+    // Render instructions as they stream in; use the one-shot endpoint if streaming is unavailable
+    streamAICookingInstructions(recipeName, payload)
+    .catch(error => {
+        console.error('Streaming unavailable, loading full instructions:', error);
+        fetchAICookingInstructions(recipeName, payload);
+    });
+}
+
+function streamAICookingInstructions(recipeName, payload) {
+    return fetch('/get_ai_instructions/stream', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify(payload)
+    })
+    .then(response => {
+        if (!response.ok || !response.body || !window.TextDecoder) {
+            throw new Error(`Streaming not available (status ${response.status})`);
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        const partial = {
+            instructions: [],
+            substitutions: [],
+            tips: [],
+            cultural_context: '',
+            serving_suggestions: []
+        };
+        let buffer = '';
+
+        function handleEvent(rawEvent) {
+            let eventName = 'message';
+            let data = '';
+            rawEvent.split('\n').forEach(line => {
+                if (line.startsWith('event:')) {
+                    eventName = line.slice(6).trim();
+                } else if (line.startsWith('data:')) {
+                    data += line.slice(5).trim();
+                }
+            });
+            if (!data) return;
+
+            const eventData = JSON.parse(data);
+            if (eventName === 'section') {
+                if (eventData.item !== undefined) {
+                    partial[eventData.section] = partial[eventData.section] || [];
+                    partial[eventData.section].push(eventData.item);
+                } else {
+                    partial[eventData.section] = eventData.value;
+                }
+                displayAIInstructions(recipeName, partial);
+            } else if (eventName === 'done' || eventName === 'error') {
+                displayAIInstructions(recipeName, eventData.instructions);
+            }
+        }
+
+        function read() {
+            return reader.read().then(({ done, value }) => {
+                if (done) return;
+                buffer += decoder.decode(value, { stream: true });
+
+                let boundary;
+                while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                    handleEvent(buffer.slice(0, boundary));
+                    buffer = buffer.slice(boundary + 2);
+                }
+                return read();
+            });
+        }
+
+        return read();
+    });
+}
+
+function fetchAICookingInstructions(recipeName, payload) {
     fetch('/get_ai_instructions', {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
         },
-        body: JSON.stringify({
-            recipe_name: recipeName,
-            user_ingredients: userIngredients,
-            recipe_ingredients: recipeIngredients
-        })
+        body: JSON.stringify(payload)
     })
     .then(response => response.json())
     .then(data => {
@@ -431,56 +632,31 @@ function saveFavorites(favorites) {
     localStorage.setItem('favoriteRecipes', JSON.stringify(favorites));
 }
 
-function isRecipeFavorite(recipeName) {
-    // This will be updated by checking with the server
-    // For now, return false and let updateHeartIcons handle the check
-    return false;
+function isRecipeFavorite(recipe) {
+    return Boolean(recipe) && favoriteIds.has(recipe.id);
 }
 
-function checkFavoriteStatus(recipeNames) {
-    if (recipeNames.length === 0) return;
-    
-    fetch('/check_favorites', {
-        method: 'POST',
-        headers: {
-            'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({
-            recipe_names: recipeNames
-        })
-    })
-    .then(response => response.json())
-    .then(data => {
-        if (data.error) {
-            console.error('Error checking favorites:', data.error);
-            return;
+function rememberFavoriteStatus(recipes) {
+    // Search results carry is_favorite from the server
+    recipes.forEach(recipe => {
+        if (recipe.is_favorite) {
+            favoriteIds.add(recipe.id);
+        } else {
+            favoriteIds.delete(recipe.id);
         }
-        
-        const favoritedNames = data.favorited_recipes || [];
-        
-        // Update heart icons based on server response
-        const recipeCards = document.querySelectorAll('#recipe-results .bg-white, #favorites-results .bg-white');
-        recipeCards.forEach(card => {
-            const title = card.querySelector('h3').textContent;
-            const heartButton = card.querySelector('button i');
-            const isFavorite = favoritedNames.includes(title);
-            
-            heartButton.className = isFavorite ? 'fas fa-heart text-pink-500 text-xl' : 'far fa-heart text-gray-400 text-xl';
-        });
-    })
-    .catch(error => {
-        console.error('Error checking favorites:', error);
     });
 }
 
-function toggleFavorite(recipeName) {
-    fetch('/toggle_favorite', {
+function toggleFavorite(recipeId, recipeName) {
+    const action = favoriteIds.has(recipeId) ? 'remove' : 'add';
+    
+    fetch('/update_favorites', {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
         },
         body: JSON.stringify({
-            recipe_name: recipeName
+            operations: [{recipe_id: recipeId, action: action}]
         })
     })
     .then(response => response.json())
@@ -490,17 +666,17 @@ function toggleFavorite(recipeName) {
             return;
         }
         
-        if (data.is_favorite) {
+        // The server answers with the full set of favorite ids
+        favoriteIds = new Set(data.favorite_ids || []);
+        
+        if (favoriteIds.has(recipeId)) {
             showMessage(`Added "${recipeName}" to favorites`, 'success');
         } else {
             showMessage(`Removed "${recipeName}" from favorites`, 'success');
         }
         
         // Update heart icons in current view
-        const recipeNames = showingFavorites ? [] : currentRecipes.map(recipe => recipe.name);
-        if (recipeNames.length > 0) {
-            setTimeout(() => checkFavoriteStatus(recipeNames), 100);
-        }
+        updateHeartIcons();
         
         // If viewing favorites, refresh the favorites view
         if (showingFavorites) {
@@ -517,11 +693,10 @@ function toggleFavorite(recipeName) {
 
 function updateHeartIcons() {
     // Update all heart icons in the current view
-    const recipeCards = document.querySelectorAll('#recipe-results .bg-white, #favorites-results .bg-white');
+    const recipeCards = document.querySelectorAll('#recipe-results [data-recipe-id], #favorites-results [data-recipe-id]');
     recipeCards.forEach(card => {
-        const title = card.querySelector('h3').textContent;
         const heartButton = card.querySelector('button i');
-        const isFavorite = isRecipeFavorite(title);
+        const isFavorite = favoriteIds.has(Number(card.dataset.recipeId));
         
         heartButton.className = isFavorite ? 'fas fa-heart text-pink-500 text-xl' : 'far fa-heart text-gray-400 text-xl';
     });
@@ -571,6 +746,7 @@ function displayFavoriteRecipes() {
         }
         
         const favoriteRecipes = data.recipes || [];
+        favoriteIds = new Set(favoriteRecipes.map(recipe => recipe.id));
         
         if (favoriteRecipes.length === 0) {
             favoritesResults.innerHTML = `
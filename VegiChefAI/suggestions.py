@@ -0,0 +1,58 @@
+"""
+Ingredient autocomplete over a sorted array of name keys
+"""
+import heapq
+from bisect import bisect_left
+
+from catalog import normalize_ingredient
+
+# Prefixes matching more keys than this keep their ranking; there are few such prefixes
+MEMO_RANGE = 256
+# Most completions kept per short prefix, and so the largest limit suggest() serves
+MAX_SUGGESTIONS = 100
+
+
+class IngredientSuggester:
+    """Prefix lookup over ingredient names, ranked by how many recipes use each ingredient
+
+    Every word start of a name is a key, so "powder" completes to "cumin powder" as
+    well as to names starting with it.
+    """
+
+    def __init__(self, counts):
+        # counts: (name, recipe_count) pairs
+        self.counts = {normalize_ingredient(name): count for name, count in counts}
+        entries = sorted((key, name) for name in self.counts for key in self._keys(name))
+        self._keys_sorted = [key for key, _ in entries]
+        self._names = [name for _, name in entries]
+        self._ranked = sorted(self.counts, key=self._rank)
+        self._memo = {}
+
+    @staticmethod
+    def _keys(name):
+        words = name.split()
+        return {' '.join(words[start:]) for start in range(len(words))} or {name}
+
+    def _rank(self, name):
+        return (-self.counts[name], name)
+
+    def __len__(self):
+        return len(self.counts)
+
+    def suggest(self, prefix, limit=10):
+        """Up to limit (name, recipe_count) pairs completing prefix, most used first"""
+        prefix = ' '.join(normalize_ingredient(prefix).split())
+        limit = min(limit, MAX_SUGGESTIONS)
+        if not prefix:
+            return [(name, self.counts[name]) for name in self._ranked[:limit]]
+        
+        names = self._memo.get(prefix)
+        if names is None:
+            start = bisect_left(self._keys_sorted, prefix)
+            end = bisect_left(self._keys_sorted, prefix + '\uffff', start)
+            if end - start <= MEMO_RANGE:
+                names = heapq.nsmallest(limit, set(self._names[start:end]), key=self._rank)
+            else:
+                names = self._memo[prefix] = heapq.nsmallest(
+                    MAX_SUGGESTIONS, set(self._names[start:end]), key=self._rank)
+        return [(name, self.counts[name]) for name in names[:limit]]
@@ -0,0 +1,52 @@
+import io
+import os
+import sys
+import json
+import tempfile
+import contextlib
+
+import pytest
+
+# The app reads its configuration at import, so point it at a scratch SQLite database first
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "test.db")
+os.environ.setdefault("SEARCH_CACHE_SIZE", "0")
+os.environ.setdefault("LAST_ACTIVE_FLUSH_INTERVAL", "3600")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db  # noqa: E402
+import migrate_data  # noqa: E402
+
+RECIPE_COUNT = 120
+
+
+def sample_recipes():
+    """Recipes with several ingredients, steps and tags each, sharing ingredients and tags"""
+    return [{
+        'name': f"Recipe {index}",
+        'ingredients': [f"ingredient {(index + offset) % 40}" for offset in range(5)],
+        'time': f"{10 + index % 30} min",
+        'steps': [f"Step {step} of recipe {index}" for step in range(1, 4)],
+        'type': ['Breakfast', 'Lunch', 'Dinner', 'Snacks'][index % 4],
+        'tags': [['Healthy', 'Quick', 'Jain'][index % 3], 'Satvik'],
+    } for index in range(RECIPE_COUNT)]
+
+
+def import_sample_catalog(path):
+    """Write the sample recipes to path and run a full import of them"""
+    path.write_text(json.dumps(sample_recipes()))
+    with contextlib.redirect_stdout(io.StringIO()):
+        migrate_data.migrate_json_to_database(str(path))
+
+
+@pytest.fixture(scope='session')
+def imported_catalog(tmp_path_factory):
+    import_sample_catalog(tmp_path_factory.mktemp('catalog') / 'recipes.json')
+    return RECIPE_COUNT
+
+
+@pytest.fixture
+def app_context():
+    with app.app_context():
+        yield
+        db.session.remove()
@@ -0,0 +1,70 @@
+import pytest
+
+import app as app_module
+from app import app
+from scoring import NumpyScoringEngine, PythonScoringEngine, np
+from sql_search import SqlScoringEngine
+
+QUERIES = [
+    {'ingredients': ['ingredient 1', 'ingredient 2', 'ingredient 3']},
+    {'ingredients': ['Ingredient 3 ', 'ingredient 1', 'INGREDIENT 2']},
+    {'ingredients': ['ingredient 1', 'ingredient 2', 'ingredient 3']},
+    {'ingredients': []},
+    {'ingredients': None},
+    {},
+    {'ingredients': ['ingredeint 7', 'ingredient 8', 'ingrdient 9']},
+    {'ingredients': ['ingredient 5', 'ingredient 6'], 'meal_type': None},
+    {'ingredients': ['ingredient 5', 'ingredient 6'], 'meal_type': 'lunch'},
+    {'ingredients': ['ingredient 5', 'ingredient 6'], 'meal_type': 'Brunch'},
+    {'ingredients': ['ingredient 1', 'ingredient 2'], 'filters': {'jain': True, 'satvik': True}},
+    {'ingredients': ['ingredient 1', 'ingredient 2'], 'filters': {'tags': 'Quick'}},
+    {'ingredients': ['ingredient 1', 'ingredient 2'], 'filters': {'tags': ['healthy', 'Satvik']}},
+    {'ingredients': ['ingredient']},
+    {'ingredients': ['saffron']},
+]
+
+ENGINES = [PythonScoringEngine, pytest.param(NumpyScoringEngine, marks=pytest.mark.skipif(np is None, reason="numpy is not installed")),
+           SqlScoringEngine]
+
+
+@pytest.fixture
+def client(imported_catalog, request, monkeypatch):
+    engine = request.param()
+    monkeypatch.setattr(app_module, 'scoring_engine', engine)
+    monkeypatch.setattr(app_module.batch_ranker, 'engine', engine)
+    client = app.test_client()
+    # Favorites show up in both responses
+    client.post('/update_favorites', json={'operations': [{'recipe_id': 2, 'action': 'add'}]})
+    return client
+
+
+@pytest.mark.parametrize('client', ENGINES, indirect=True)
+def test_batch_results_match_single_searches(client):
+    response = client.post('/search_recipes/batch', json={'queries': QUERIES})
+    assert response.status_code == 200
+    results = response.get_json()['results']
+
+    singles = []
+    for query in QUERIES:
+        single = client.post('/search_recipes', json=query)
+        assert single.status_code == 200
+        singles.append(single.get_json())
+    assert results == singles
+
+    assert any(result['recipes'] for result in results)
+    assert any(recipe['is_favorite'] for result in results for recipe in result['recipes'])
+    assert any(result.get('corrections') for result in results)
+
+
+@pytest.mark.parametrize('query', [
+    {'ingredients': ['ingredient 1'], 'filters': {'tags': [1]}},
+    {'ingredients': ['ingredient 1'], 'filters': {'tags': 5}},
+    {'ingredients': ['ingredient 1'], 'filters': None},
+    {'ingredients': ['ingredient 1'], 'meal_type': 3},
+    {'ingredients': 'ingredient 1'},
+    ['ingredient 1'],
+])
+def test_malformed_queries_are_rejected(imported_catalog, query):
+    response = app.test_client().post('/search_recipes/batch', json={'queries': [{'ingredients': ['ingredient 1']}, query]})
+    assert response.status_code == 400
+    assert 'positions [1]' in response.get_json()['error']
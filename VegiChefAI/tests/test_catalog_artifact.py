@@ -0,0 +1,30 @@
+import pickle
+
+import pytest
+
+from catalog import CATALOG_ARTIFACT_FORMAT, CatalogSnapshot, load_snapshot, save_snapshot
+from conftest import sample_recipes
+
+
+def test_artifact_round_trip(tmp_path):
+    path = tmp_path / 'catalog.pkl'
+    snapshot = CatalogSnapshot(3, sample_recipes(), vocabulary=['salt', 'ingredient 1'])
+    save_snapshot(snapshot, path)
+
+    loaded = load_snapshot(path)
+    assert loaded.version == 3
+    assert loaded.resolver.ids == snapshot.resolver.ids
+    assert loaded.recipe_ingredient_ids == snapshot.recipe_ingredient_ids
+    assert loaded.pantry_ids(['ingredient 1']) == snapshot.pantry_ids(['ingredient 1'])
+    assert loaded.lexicon.version == 3
+    assert loaded.lexicon.speller.correct('ingredeint 1') == 'ingredient 1'
+    assert loaded.lexicon.suggester.suggest('ingredient 1', 3) == snapshot.lexicon.suggester.suggest('ingredient 1', 3)
+    assert loaded.resolver.add('saffron') == max(snapshot.resolver.ids.values()) + 1
+
+
+def test_artifacts_of_another_format_are_rejected(tmp_path):
+    path = tmp_path / 'catalog.pkl'
+    with open(path, 'wb') as f:
+        pickle.dump({'format': CATALOG_ARTIFACT_FORMAT - 1, 'snapshot': None}, f)
+    with pytest.raises(ValueError, match='format'):
+        load_snapshot(path)
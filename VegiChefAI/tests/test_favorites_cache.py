@@ -0,0 +1,52 @@
+import pytest
+
+import app as app_module
+from app import app
+from favorites_cache import FavoriteIdsCache
+
+
+@pytest.fixture
+def client(imported_catalog):
+    return app.test_client()
+
+
+def favorite_all(client, count):
+    response = client.post('/update_favorites', json={
+        'operations': [{'recipe_id': recipe_id, 'action': 'add'} for recipe_id in range(1, count + 1)]})
+    assert response.status_code == 200
+    return response.get_json()['favorite_ids']
+
+
+def test_session_cookie_does_not_grow_with_favorites(client, imported_catalog):
+    client.post('/update_favorites', json={'operations': [{'recipe_id': 1, 'action': 'add'}]})
+    one_favorite = len(client.get_cookie('session').value)
+
+    assert len(favorite_all(client, imported_catalog)) == imported_catalog
+    assert len(client.get_cookie('session').value) == one_favorite
+    with client.session_transaction() as session:
+        assert set(session) == {'user_id', 'favorites_token'}
+    assert len(client.get('/get_favorites').get_json()['recipes']) == imported_catalog
+
+
+def test_other_workers_reload_favorites_after_a_write(client, monkeypatch):
+    client.post('/update_favorites', json={'operations': [{'recipe_id': 1, 'action': 'add'}]})
+    assert [recipe['id'] for recipe in client.get('/get_favorites').get_json()['recipes']] == [1]
+
+    # Another worker, with its own cache, handles the next write
+    worker_cache = app_module.favorites_cache
+    monkeypatch.setattr(app_module, 'favorites_cache', FavoriteIdsCache())
+    client.post('/update_favorites', json={'operations': [{'recipe_id': 2, 'action': 'add'}]})
+    monkeypatch.setattr(app_module, 'favorites_cache', worker_cache)
+
+    assert [recipe['id'] for recipe in client.get('/get_favorites').get_json()['recipes']] == [1, 2]
+
+
+def test_cache_evicts_least_recently_used_users():
+    cache = FavoriteIdsCache(max_entries=2)
+    cache.put(1, 'a', [1])
+    cache.put(2, 'b', [2])
+    assert cache.get(1, 'a') == {1}
+    cache.put(3, 'c', [3])
+    assert cache.get(2, 'b') is None
+    assert cache.get(1, 'a') == {1}
+    assert cache.get(1, 'stale') is None
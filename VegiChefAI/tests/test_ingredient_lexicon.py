@@ -0,0 +1,55 @@
+import pytest
+from sqlalchemy import event
+
+import app as app_module
+from app import app, db
+from catalog import IngredientLexicon
+
+
+@pytest.fixture
+def snapshot(imported_catalog):
+    app_module.catalog_cache.invalidate()
+    return app_module.catalog_cache.get()
+
+
+def test_snapshot_lexicon_matches_the_ingredients_table(snapshot):
+    with app.app_context():
+        from_database = IngredientLexicon(snapshot.version, app_module.ingredient_recipe_counts())
+        db.session.remove()
+    assert snapshot.lexicon.suggester.counts == from_database.suggester.counts
+    assert snapshot.lexicon.speller.counts == from_database.speller.counts
+    for prefix in ['', 'ingredient', 'ingredient 1', '3', 'x']:
+        assert snapshot.lexicon.suggester.suggest(prefix, 50) == from_database.suggester.suggest(prefix, 50)
+
+
+def test_requests_use_the_lexicon_built_with_the_snapshot(snapshot):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    client = app.test_client()
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        suggestions = client.get('/ingredients/suggest?q=ingredient&limit=3').get_json()['suggestions']
+        result = client.post('/search_recipes', json={'ingredients': ['ingredeint 7', 'ingredient 8']}).get_json()
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+    assert [suggestion['recipes'] for suggestion in suggestions] == [15, 15, 15]
+    assert result['corrections'] == [{'term': 'ingredeint 7', 'ingredient': 'ingredient 7', 'replaced': True}]
+    # No per-request GROUP BY over recipe_ingredients
+    assert not [statement for statement in statements if 'recipe_ingredients' in statement]
+
+
+def test_sql_engine_keeps_a_lexicon_of_its_own(imported_catalog, monkeypatch):
+    from sql_search import SqlScoringEngine
+    monkeypatch.setattr(app_module, 'scoring_engine', SqlScoringEngine())
+    client = app.test_client()
+    suggestions = client.get('/ingredients/suggest?q=ingredient 3&limit=2').get_json()['suggestions']
+    assert [suggestion['name'] for suggestion in suggestions] == ['ingredient 3', 'ingredient 30']
+    result = client.post('/search_recipes', json={'ingredients': ['ingredeint 7', 'ingredient 8']}).get_json()
+    assert result['corrections'][0]['ingredient'] == 'ingredient 7'
+    assert app_module.lexicon_cache.peek() is not None
@@ -0,0 +1,168 @@
+import json
+import time
+import random
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import app as app_module
+from app import app
+from instruction_cache import ComputationAbandoned, InstructionCache
+from openai_helper import InstructionStreamParser
+
+INSTRUCTIONS = {
+    "instructions": [
+        "Heat ghee and add \"jeera\" - wait till it splutters",
+        "Add the tomatoes ] and } stay inside strings, as do \\ backslashes",
+        {"step": "Nested {objects} in items", "tips": ["a", {"deeper": [1, 2]}], "time": 5},
+        "Unicode: haldi हल्दी",
+    ],
+    "substitutions": [],
+    "tips": ["Keep stirring, beta", "Use a heavy \"kadhai\""],
+    "cultural_context": "Made at every festival, with a \"]\" for good measure",
+    "serving_suggestions": [["roti", "rice"], {"with": "curd"}, 3, True, None],
+    "servings": 4,
+}
+
+
+def expected_events(instructions):
+    events = []
+    for section, value in instructions.items():
+        if isinstance(value, list):
+            events.extend({'section': section, 'item': item} for item in value)
+        else:
+            events.append({'section': section, 'value': value})
+    return events
+
+
+def parse_in_pieces(text, cuts):
+    parser = InstructionStreamParser()
+    events = []
+    start = 0
+    for end in sorted(cuts) + [len(text)]:
+        events.extend(parser.feed(text[start:end]))
+        start = end
+    return events, parser.result()
+
+
+@pytest.mark.parametrize('indent', [None, 2])
+def test_parser_events_do_not_depend_on_where_the_stream_splits(indent):
+    text = json.dumps(INSTRUCTIONS, indent=indent)
+    expected = expected_events(INSTRUCTIONS)
+    # Every single split point, then random splits into many pieces
+    splits = [[cut] for cut in range(1, len(text))]
+    rng = random.Random(7)
+    splits += [rng.sample(range(1, len(text)), rng.randint(2, 40)) for _ in range(200)]
+    splits.append(list(range(1, len(text))))
+    for cuts in splits:
+        events, result = parse_in_pieces(text, cuts)
+        assert events == expected, cuts
+        assert result == INSTRUCTIONS
+
+
+class FakeStreamClient:
+    """Stands in for the OpenAI client: streams fixed text in small chunks after a delay"""
+
+    def __init__(self, text, delay=0.0, chunk_size=7):
+        self.text = text
+        self.delay = delay
+        self.chunk_size = chunk_size
+        self.calls = 0
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        assert kwargs['stream'] is True
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        return [SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=self.text[start:start + self.chunk_size]))])
+                for start in range(0, len(self.text), self.chunk_size)]
+
+
+def server_sent_events(body):
+    """(event, data) pairs of an event stream, skipping comments"""
+    events = []
+    for block in body.decode('utf-8').split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines() if line and not line.startswith(':'))
+        if fields:
+            events.append((fields['event'], json.loads(fields['data'])))
+    return events
+
+
+@pytest.fixture
+def stream_client(imported_catalog, monkeypatch):
+    def install(text, delay=0.0):
+        fake = FakeStreamClient(text, delay)
+        monkeypatch.setattr(app_module, 'instruction_stream_client', fake)
+        return fake
+    return install
+
+
+def request_stream(recipe_name):
+    response = app.test_client().post('/get_ai_instructions/stream', json={
+        'recipe_name': recipe_name, 'user_ingredients': ['rice'], 'recipe_ingredients': ['rice', 'dal']})
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    return server_sent_events(response.get_data())
+
+
+def test_stream_sends_sections_then_done(stream_client):
+    fake = stream_client(json.dumps(INSTRUCTIONS))
+    events = request_stream('Stream Test Khichdi')
+    assert events == [('section', event) for event in expected_events(INSTRUCTIONS)] + \
+        [('done', {'instructions': INSTRUCTIONS})]
+
+    # A repeat is replayed from the cache as the same events
+    assert request_stream('Stream Test Khichdi') == events
+    assert fake.calls == 1
+
+
+def test_invalid_json_ends_the_stream_with_fallback_instructions(stream_client):
+    fake = stream_client('{"instructions": ["Boil water", "Add rice"], "tips": [oops')
+    events = request_stream('Stream Test Broken')
+    assert events[:2] == [('section', {'section': 'instructions', 'item': 'Boil water'}),
+                          ('section', {'section': 'instructions', 'item': 'Add rice'})]
+    name, data = events[-1]
+    assert name == 'error'
+    assert set(data['instructions']) == {'instructions', 'substitutions', 'tips', 'cultural_context',
+                                         'serving_suggestions'}
+    assert "couldn't get proper cooking instructions" in data['instructions']['instructions'][0]
+
+    # Failures are not cached
+    request_stream('Stream Test Broken')
+    assert fake.calls == 2
+
+
+def test_concurrent_identical_streams_share_one_upstream_call(stream_client):
+    fake = stream_client(json.dumps(INSTRUCTIONS), delay=0.3)
+    results = [None] * 4
+
+    def run(index):
+        results[index] = request_stream('Stream Test Concurrent')
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(len(results))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert fake.calls == 1
+    expected = [('section', event) for event in expected_events(INSTRUCTIONS)] + \
+        [('done', {'instructions': INSTRUCTIONS})]
+    assert results == [expected] * len(results)
+
+
+def test_waiters_take_over_when_the_streaming_request_goes_away():
+    cache = InstructionCache(max_entries=8)
+    future, leader = cache.claim('key')
+    assert leader
+    result = []
+    waiter = threading.Thread(target=lambda: result.append(cache.get_or_compute('key', lambda: {'tips': ['x']})))
+    waiter.start()
+    time.sleep(0.05)
+    cache.settle('key', future, error=ComputationAbandoned('key'))
+    waiter.join()
+    assert result == [{'tips': ['x']}]
+    assert cache.get('key') == {'tips': ['x']}
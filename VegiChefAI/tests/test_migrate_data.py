@@ -0,0 +1,18 @@
+from app import app, db
+from conftest import RECIPE_COUNT, import_sample_catalog
+from models import CachedInstruction, Recipe, get_catalog_version
+
+
+def test_full_import_keeps_cached_instructions(imported_catalog, tmp_path):
+    with app.app_context():
+        db.session.add(CachedInstruction(cache_key='k' * 64, recipe_name='Recipe 1', payload='{"tips": []}'))
+        db.session.commit()
+        version = get_catalog_version()
+
+    import_sample_catalog(tmp_path / 'recipes.json')
+
+    with app.app_context():
+        assert [entry.payload for entry in CachedInstruction.query.filter_by(cache_key='k' * 64)] == ['{"tips": []}']
+        assert Recipe.query.count() == RECIPE_COUNT
+        assert get_catalog_version() > version
+        db.session.remove()
@@ -0,0 +1,84 @@
+import contextlib
+
+import pytest
+from sqlalchemy import event
+
+from app import db
+from conftest import RECIPE_COUNT
+from models import Recipe, RecipeIngredient, RecipeStep, RecipeTag, load_recipe_dicts, recipe_loader_options
+
+
+@contextlib.contextmanager
+def count_queries():
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+
+@pytest.mark.parametrize('count', [1, 50, None])
+def test_load_recipe_dicts_query_count_is_constant(imported_catalog, app_context, count):
+    recipe_ids = None if count is None else list(range(1, count + 1))
+    with count_queries() as statements:
+        recipes = load_recipe_dicts(recipe_ids)
+    assert len(recipes) == (RECIPE_COUNT if count is None else count)
+    assert len(statements) == 4
+    assert all(recipe['ingredients'] and recipe['steps'] and recipe['tags'] for recipe in recipes)
+
+
+@pytest.mark.parametrize('count', [1, 50, None])
+def test_eager_loaded_to_dict_query_count_is_constant(imported_catalog, app_context, count):
+    db.session.expunge_all()
+    query = Recipe.query.options(*recipe_loader_options()).order_by(Recipe.id)
+    if count is not None:
+        query = query.limit(count)
+    with count_queries() as statements:
+        recipes = [recipe.to_dict() for recipe in query]
+    assert len(recipes) == (RECIPE_COUNT if count is None else count)
+    # Recipes, then ingredients (with their names joined), steps and tags
+    assert len(statements) == 4
+
+
+def test_loader_matches_lazy_loading(imported_catalog, app_context):
+    db.session.expunge_all()
+    lazy = [recipe.to_dict() for recipe in Recipe.query.order_by(Recipe.id)]
+    assert load_recipe_dicts() == lazy
+
+
+def test_recipes_committed_between_the_loader_queries_are_skipped(imported_catalog, app_context):
+    engine = db.engine
+    statements = []
+
+    def commit_a_recipe_after_the_first_query(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+        if len(statements) != 2:
+            return
+        # Another process imports a recipe once the recipes query has run
+        with engine.begin() as other:
+            recipe_id = other.execute(Recipe.__table__.insert().values(
+                name='Late Recipe', time='5 min', type='Snacks')).inserted_primary_key[0]
+            other.execute(RecipeStep.__table__.insert().values(
+                recipe_id=recipe_id, step_number=1, description='Arrives late'))
+            other.execute(RecipeIngredient.__table__.insert().values(recipe_id=recipe_id, ingredient_id=1))
+            other.execute(RecipeTag.__table__.insert().values(recipe_id=recipe_id, tag_id=1))
+
+    event.listen(engine, 'before_cursor_execute', commit_a_recipe_after_the_first_query)
+    try:
+        recipes = load_recipe_dicts()
+    finally:
+        event.remove(engine, 'before_cursor_execute', commit_a_recipe_after_the_first_query)
+        with engine.begin() as other:
+            late_id = other.execute(db.select(Recipe.id).where(Recipe.name == 'Late Recipe')).scalar()
+            for model in (RecipeIngredient, RecipeStep, RecipeTag):
+                other.execute(model.__table__.delete().where(model.recipe_id == late_id))
+            other.execute(Recipe.__table__.delete().where(Recipe.id == late_id))
+
+    assert late_id is not None
+    assert len(recipes) == RECIPE_COUNT
+    assert 'Late Recipe' not in {recipe['name'] for recipe in recipes}
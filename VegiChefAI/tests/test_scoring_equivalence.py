@@ -0,0 +1,151 @@
+import io
+import json
+import random
+import contextlib
+
+import pytest
+
+import migrate_data
+from app import app, db
+from catalog import CatalogSnapshot
+from conftest import import_sample_catalog
+from models import load_recipe_dicts
+from scoring import (FILTER_TAGS, MATCH_THRESHOLD, TOP_N, NumpyScoringEngine, PythonScoringEngine,
+                     calculate_match_percentage, filter_recipes, get_missing_ingredients, np, rank_many)
+from sql_search import SqlScoringEngine
+
+needs_numpy = pytest.mark.skipif(np is None, reason="numpy is not installed")
+
+SEED = 20240601
+SEARCHES = 400
+
+# Words combine into names that contain one another ("salt", "rock salt", "butter rock salted")
+WORDS = ['salt', 'rock', 'chilli', 'green', 'red', 'oil', 'mustard', 'paneer', 'rice', 'dal', 'ghee',
+         'tomato', 'potato', 'sweet', 'butter', 'pepper', 'leaves', 'seeds', 'cumin', 'coriander', 'a']
+TAGS = list(FILTER_TAGS.values()) + ['Vegan', 'Festive']
+TYPES = ['Breakfast', 'Lunch', 'Dinner', 'Snacks']
+
+
+def random_name(rng):
+    name = ' '.join(rng.sample(WORDS, rng.choice([1, 1, 2, 2, 3])))
+    if rng.random() < 0.1:
+        name += 'ed'
+    return name
+
+
+def random_case(rng, name):
+    """The name as a user or a recipe author might write it"""
+    name = rng.choice([name, name.title(), name.upper()])
+    return rng.choice(['', ' ', '  ']) + name + rng.choice(['', ' ', '\t'])
+
+
+def synthetic_catalog(rng, vocabulary, count=300):
+    recipes = []
+    for index in range(count):
+        # Distinct ingredients per recipe, in the author's own case and spacing
+        names = rng.sample(vocabulary, rng.choice([0, 1, 2, 3, 4, 5, 6, 8]) if index else 0)
+        recipes.append({
+            'id': index + 1,
+            'name': f"Recipe {index}",
+            'time': '20 min',
+            'ingredients': [random_case(rng, name) for name in names],
+            'type': rng.choice(TYPES + [t.lower() for t in TYPES]),
+            'tags': rng.sample(TAGS, rng.randint(0, 4)),
+        })
+    return recipes
+
+
+def random_pantry(rng, vocabulary):
+    pantry = []
+    for _ in range(rng.randint(0, 8)):
+        name = rng.choice(vocabulary)
+        kind = rng.random()
+        if kind < 0.2:
+            # Part of a name, which satisfies every ingredient containing it
+            start = rng.randrange(len(name))
+            name = name[start:rng.randint(start + 1, len(name))]
+        elif kind < 0.35:
+            # Free text holding names, which satisfies every ingredient it contains
+            name = f"{random_name(rng)} {name} {rng.choice(['fresh', 'chopped', 'x'])}"
+        elif kind < 0.4:
+            name = rng.choice(['saffron', 'kale', 'q', 'chillies'])
+        pantry.append(random_case(rng, name))
+    return pantry
+
+
+def random_filters(rng):
+    filters = {flag: True for flag in FILTER_TAGS if rng.random() < 0.15}
+    if rng.random() < 0.2:
+        filters['tags'] = rng.sample(TAGS, rng.randint(1, 2))
+    meal_type = rng.choice(['All', '', None] + TYPES + ['dinner', 'Brunch'])
+    return filters, meal_type
+
+
+def reference_rank(recipes, user_ingredients, filters, meal_type):
+    """The ranking search_recipes did before the engines: string scans over every recipe"""
+    matches = []
+    for recipe in filter_recipes(recipes, filters, meal_type):
+        match_percentage = calculate_match_percentage(user_ingredients, recipe['ingredients'])
+        if match_percentage >= MATCH_THRESHOLD:
+            missing = get_missing_ingredients(user_ingredients, recipe['ingredients'])
+            matches.append((recipe['id'], match_percentage, missing))
+    matches.sort(key=lambda match: match[1], reverse=True)
+    return matches[:TOP_N]
+
+
+@pytest.fixture(scope='module')
+def catalog():
+    rng = random.Random(SEED)
+    vocabulary = sorted({random_name(rng) for _ in range(80)} | set(WORDS))
+    recipes = synthetic_catalog(rng, vocabulary)
+    # Half the vocabulary comes from the ingredients table, the rest from the recipes themselves
+    snapshot = CatalogSnapshot(1, recipes, vocabulary[::2])
+    searches = [(random_pantry(rng, vocabulary),) + random_filters(rng) for _ in range(SEARCHES)]
+    return snapshot, searches
+
+
+@pytest.mark.parametrize('engine_class', [PythonScoringEngine, pytest.param(NumpyScoringEngine, marks=needs_numpy)])
+def test_engine_matches_reference(catalog, engine_class):
+    snapshot, searches = catalog
+    engine = engine_class()
+    for user_ingredients, filters, meal_type in searches:
+        ranked = engine.rank(snapshot, user_ingredients, filters, meal_type)
+        expected = reference_rank(snapshot.recipes, user_ingredients, filters, meal_type)
+        assert [(match.recipe['id'], match.match_percentage, match.missing_ingredients) for match in ranked] == expected, \
+            (user_ingredients, filters, meal_type)
+
+
+@needs_numpy
+def test_batched_numpy_matches_reference(catalog):
+    snapshot, searches = catalog
+    for (user_ingredients, filters, meal_type), ranked in zip(searches, rank_many(NumpyScoringEngine(), snapshot, searches)):
+        expected = reference_rank(snapshot.recipes, user_ingredients, filters, meal_type)
+        assert [(match.recipe['id'], match.match_percentage, match.missing_ingredients) for match in ranked] == expected
+
+
+@pytest.fixture(scope='module')
+def sql_catalog(catalog, imported_catalog, tmp_path_factory):
+    """The synthetic catalog imported into the test database, as the SQL engine sees it"""
+    snapshot, searches = catalog
+    path = tmp_path_factory.mktemp('synthetic') / 'recipes.json'
+    path.write_text(json.dumps(snapshot.recipes))
+    with contextlib.redirect_stdout(io.StringIO()):
+        migrate_data.migrate_json_to_database(str(path))
+    try:
+        with app.app_context():
+            yield load_recipe_dicts(), searches
+            db.session.remove()
+    finally:
+        # Other tests expect the sample catalog
+        import_sample_catalog(tmp_path_factory.mktemp('catalog') / 'recipes.json')
+
+
+def test_sql_engine_matches_reference(sql_catalog):
+    recipes, searches = sql_catalog
+    assert len(recipes) == 300
+    engine = SqlScoringEngine()
+    for user_ingredients, filters, meal_type in searches:
+        ranked = engine.rank(None, user_ingredients, filters, meal_type)
+        expected = reference_rank(recipes, user_ingredients, filters, meal_type)
+        assert [(match.recipe['id'], match.match_percentage, match.missing_ingredients) for match in ranked] == expected, \
+            (user_ingredients, filters, meal_type)
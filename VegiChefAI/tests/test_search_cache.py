@@ -0,0 +1,59 @@
+import app as app_module
+from app import app
+from search_cache import SearchResultCache, canonical_search
+
+
+def search(query):
+    response = app.test_client().post('/search_recipes', json=query)
+    assert response.status_code == 200
+    return response.get_data()
+
+
+def test_equivalent_searches_share_one_entry_and_match_a_cold_run(imported_catalog, monkeypatch):
+    first = {'ingredients': ['ingredient 1', 'ingredient 2', 'ingredient 3'],
+             'filters': {'satvik': True, 'tags': ['Satvik']}, 'meal_type': 'Lunch'}
+    same = {'ingredients': [' INGREDIENT 3', 'ingredient 1', 'Ingredient 2', 'ingredient 1'],
+            'filters': {'tags': 'satvik', 'satvik': True}, 'meal_type': 'lunch'}
+    assert canonical_search(first['ingredients'], first['filters'], first['meal_type']) == \
+        canonical_search(same['ingredients'], same['filters'], same['meal_type'])
+
+    monkeypatch.setattr(app_module, 'search_cache', SearchResultCache(max_entries=8))
+    cold = search(same)
+    assert b'"match_percentage"' in cold
+
+    cache = SearchResultCache(max_entries=8)
+    monkeypatch.setattr(app_module, 'search_cache', cache)
+    search(first)
+    assert cache.stats() == {'entries': 1, 'hits': 0, 'misses': 1, 'evictions': 0}
+    assert search(same) == cold
+    assert cache.stats() == {'entries': 1, 'hits': 1, 'misses': 1, 'evictions': 0}
+
+
+def test_counters_and_lru_eviction():
+    cache = SearchResultCache(max_entries=2)
+    assert cache.get(1, 'a') is None
+    cache.put(1, 'a', ['A'])
+    cache.put(1, 'b', ['B'])
+    assert cache.get(1, 'a') == ['A']
+    cache.put(1, 'c', ['C'])
+    assert cache.get(1, 'b') is None
+    assert cache.get(1, 'c') == ['C']
+    assert cache.stats() == {'entries': 2, 'hits': 2, 'misses': 2, 'evictions': 1}
+
+
+def test_a_new_catalog_version_drops_every_entry():
+    cache = SearchResultCache(max_entries=4)
+    cache.put(1, 'a', ['A'])
+    cache.put(1, 'b', ['B'])
+    assert cache.get(2, 'a') is None
+    cache.put(2, 'c', ['C'])
+    assert cache.get(1, 'a') is None
+    assert cache.get(2, 'c') == ['C']
+    assert cache.stats() == {'entries': 1, 'hits': 1, 'misses': 2, 'evictions': 2}
+
+
+def test_disabled_cache_stores_nothing():
+    cache = SearchResultCache(max_entries=0)
+    cache.put(1, 'a', ['A'])
+    assert cache.get(1, 'a') is None
+    assert len(cache) == 0
@@ -0,0 +1,50 @@
+"""
+Coalesces per-request user activity into periodic batched last_active writes
+"""
+import time
+import logging
+import threading
+from datetime import datetime
+
+
+class LastActiveTracker:
+    """Remembers when each user was last seen and flushes the timestamps in one batch"""
+
+    def __init__(self, write_batch, flush_interval=60.0):
+        # write_batch(rows) persists [{'user_id': ..., 'last_active': ...}, ...]
+        self._write_batch = write_batch
+        self.flush_interval = flush_interval
+        self._pending = {}
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def touch(self, user_id):
+        """Record activity in memory only"""
+        with self._lock:
+            self._pending[user_id] = datetime.utcnow()
+
+    def flush_if_due(self):
+        """Flush when the interval has elapsed; returns the number of users written"""
+        if time.monotonic() - self._last_flush < self.flush_interval:
+            return 0
+        return self.flush()
+
+    def flush(self):
+        """Write every pending timestamp now"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        if not pending:
+            return 0
+        try:
+            self._write_batch([{'user_id': user_id, 'last_active': last_active}
+                               for user_id, last_active in pending.items()])
+            return len(pending)
+        except Exception as e:
+            logging.error(f"Error flushing last_active updates: {e}")
+            # Keep the newest timestamps for the next attempt
+            with self._lock:
+                for user_id, last_active in pending.items():
+                    if self._pending.get(user_id, last_active) <= last_active:
+                        self._pending[user_id] = last_active
+            return 0